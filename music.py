@@ -1,31 +1,53 @@
+import time
+STARTUP_STARTED = time.perf_counter()  # taken before the heavy imports, see StartupTimer
 import os
 import sys
+if __name__ == "__main__":
+    # Install an update staged by the last session before anything it replaces is imported,
+    # then start over so this file is the new one too
+    from utils import updater
+    try:
+        installed = updater.apply_pending()
+    except Exception as e:
+        print(f"Could not install the staged update: {e}")
+        installed = 0
+    if installed:
+        # Not os.execv: on Windows it passes arguments unquoted, breaking paths with spaces
+        import subprocess
+        subprocess.Popen([sys.executable] + sys.argv)
+        sys.exit(0)
 import json
 import threading
 import queue
-import time
-import traceback
 from typing import Any, Optional
-import yt_dlp
 import pygame
-from utils.ui_framework import UIManager, Button, Label, TextBox, Slider, StyleManager, Widget, Container, GlobalEventRegistry, JSONUILoader, Event
+import numpy as np
+from utils.ui_framework import UIManager, Button, Label, TextBox, Slider, StyleManager, Widget, Container, GlobalEventRegistry, JSONUILoader, Event, FrameScheduler, WakeQueue, cursor_blink_on, get_font, render_text
 import pypresence
 import random
 from mutagen.mp3 import MP3
 import subprocess, platform
-import requests
+import socket
+import collections
 import utils.updater as updater
+from utils.library import LibraryIndex
+from utils.youtube import YouTubeIdValidator
+from utils.scanner import LibraryScanner
+from utils.watcher import LibraryWatcher
+from utils.downloads import DownloadManager, format_bytes
+from utils.search import SearchIndex
+from utils.playback import PlaybackEngine, PlaybackClock
+from utils.pcm_cache import PCMCache
+from utils.loudness import LoudnessAnalyzer, ffmpeg_available, decode_waveform
+from utils.spectrum import SpectrumAnalyzer, save_spectrogram
+from utils.startup import StartupTimer
+from utils.tracks import TrackTable, PlaylistQueue
+from utils.playlists import list_playlists, iter_tracks, apply_op, PlaylistJournal
 
 GlobalEventRegistry = GlobalEventRegistry
 
-settings = json.load(open("config/settings.json", "r"))
-
-if settings["auto_update_on_start"]:
-    local_ver = updater.get_local_version()
-    remote_ver = updater.get_remote_version()
-    print(f"Local version: {local_ver} | Remote version: {remote_ver}")
-    if local_ver != remote_ver:
-        updater.Update()
+with open("config/settings.json", "r") as f:
+    settings = json.load(f)
 
 class RPCWraper(pypresence.Presence):
     def __init__(self):
@@ -33,14 +55,15 @@ class RPCWraper(pypresence.Presence):
         self.Connected = False
     
     def _connect(self):
-        self.Connected = True
         self.connect()
+        self.Connected = True
     
     def _close(self):
         self.Connected = False
         self.close()
 
-rpc = RPCWraper()
+# Created by OnlineManager on its thread the first time presence is sent
+rpc: Optional[RPCWraper] = None
 
 RPCDefault = {
     "details": "Terra's Music Player",
@@ -52,8 +75,6 @@ RPCDefault = {
     "small_text": "Terra's Music Player"
 }
 
-RPCdata = RPCDefault
-
 # ---- Configuration ----
 MUSIC_DIR = settings["music_dir"] or "music"
 METADATA_DIR = f"{MUSIC_DIR}/metadata"
@@ -61,17 +82,53 @@ PLAYLIST_DIR = settings["playlist_dir"] or "playlists"
 STYLES_FILE = settings["styles_file"] or "config/styles.json"
 UI_DIR = settings["ui_dir"] or "config/UIs"
 
-UI_Loader = JSONUILoader(UI_DIR, STYLES_FILE)
+# Built in main() once the window is up, see create_ui_loader
+UI_Loader: Optional[JSONUILoader] = None
+
+# Both are set up by open_library() from main(). Worker processes re-import this module (spawn
+# on Windows), so nothing at module level may create folders or open the database.
+# Single indexed store for song metadata, migrated from the per-song JSON files on first run
+library: LibraryIndex = None # type: ignore
+# In-memory Track objects shared by every queue; queues only hold their ids
+tracks: TrackTable = None # type: ignore
 
-os.makedirs(MUSIC_DIR, exist_ok=True)
-os.makedirs(PLAYLIST_DIR, exist_ok=True)
-os.makedirs(METADATA_DIR, exist_ok=True)
+def open_library():
+    global library, tracks
+    os.makedirs(MUSIC_DIR, exist_ok=True)
+    os.makedirs(PLAYLIST_DIR, exist_ok=True)
+    os.makedirs(METADATA_DIR, exist_ok=True)
+    library = LibraryIndex(os.path.join(METADATA_DIR, "library.db"), legacy_dir=METADATA_DIR)
+    tracks = TrackTable()
 
-pygame.init()
-pygame.mixer.init()
 # event posted when a track ends
 TRACK_END_EVENT = pygame.USEREVENT + 1
-pygame.mixer.music.set_endevent(TRACK_END_EVENT)
+# event posted when a background thread sends a message to the UI
+UI_WAKE_EVENT = pygame.USEREVENT + 2
+# event posted when a chunk of a cached track finishes on the playback channel
+PCM_CHUNK_EVENT = pygame.USEREVENT + 3
+
+# Spectrograms from the loudness analysis, played back by the visualizer
+SPECTRA_DIR = os.path.join(METADATA_DIR, "spectra")
+
+DOWNLOAD_OPTS = {
+    "format": "bestaudio[ext=m4a]/bestaudio/best",
+    "outtmpl": os.path.join(MUSIC_DIR, "%(title).200s-%(id)s.%(ext)s"),
+    "postprocessors": [{
+        "key": "FFmpegExtractAudio",
+        "preferredcodec": "mp3",
+        "preferredquality": "192",
+    }],
+    "quiet": True,
+    "noprogress": True,  # progress is reported through the UI instead
+    "noplaylist": True,  # playlists are expanded into one queued job per entry
+    "nopart": True,
+    "geo_bypass": True,  # optional: bypass some region restrictions
+    "cookies": "cookies.txt",
+    "no-abort-on-error": True,
+    "ignoreerrors": True
+}
+
+BACKGROUND_COLOR = (40, 40, 40)
 
 # ---- Utilities ----
 def safe_style_get(sm, key, default=None):
@@ -83,21 +140,18 @@ def safe_style_get(sm, key, default=None):
 def sanitize_filename_for_display(path):
     return os.path.basename(path)
 
-def filename_has_youtube_id(filename):
-    #Returns True if the filename contains a valid youtube ID. Checks the extracted ID with requests.
-    id = get_youtube_id_from_filename(filename)
-    try:
-        requests.get(f"https://www.youtube.com/watch?v={id}")
-        return True
-    except Exception:
-        return False
+def _store_youtube_id_results(results: dict[str, bool]):
+    for youtube_id, valid in results.items():
+        metadata = library.get_by_youtube_id(youtube_id)
+        if metadata:
+            library.update(metadata["path"], youtube_id_valid=valid)
 
-def strip_youtube_id_from_filename(filename: str):
-    #Splits the filename and returns the "title" which is the portion before the last " - " in the filename. If multiple " - " are present rejoin the non-id portion with " - "
-    return filename[:-16]
+def _stored_youtube_id_result(youtube_id):
+    metadata = library.get_by_youtube_id(youtube_id)
+    return metadata.get("youtube_id_valid") if metadata else None
 
-def get_youtube_id_from_filename(filename):
-    return filename[-15:-4]
+# Online id validation is optional and never runs on the scanning thread
+youtube_validator = YouTubeIdValidator(_store_youtube_id_results, stored_result=_stored_youtube_id_result)
 
 def get_random_flavor_message():
     flavorFile = "config/flavor.json"
@@ -106,136 +160,208 @@ def get_random_flavor_message():
     return data["flavors"][random.randint(0, len(data["flavors"]) - 1)]
 
 def get_playlists() -> dict[str, Any]:
-    playlists = {}
-    for playlist in os.listdir(PLAYLIST_DIR):
-        with open(os.path.join(PLAYLIST_DIR, playlist), "r", encoding="utf-8") as f:
-            playlists[playlist[:-5]] = json.load(f)
-    return playlists
+    # Only the header of each file is read, the tracks are streamed on load
+    return list_playlists(PLAYLIST_DIR)
 
 def save_song_metadata(metadata):
-    with open(f'{METADATA_DIR}/{metadata["title"]}.json', 'w', encoding='utf-8') as f:
-        json.dump(metadata, f, indent=2)
+    library.put(metadata)
     
 def load_song_metadata(title):
-    with open(f'{METADATA_DIR}/{title}.json', 'r', encoding='utf-8') as f:
-        return json.load(f)
-    
-def check_for_metadata_file(mp3_path):
-    for metadata_file in os.listdir(METADATA_DIR):
-        if metadata_file.endswith(".json"):
-            metadata = load_song_metadata(metadata_file[:-5])
-            if metadata["path"] == mp3_path:
-                return metadata
-    return None
+    metadata = library.get_by_title(title)
+    if metadata is None:
+        raise KeyError(f"No metadata for {title}")
+    return metadata
     
-def _get_song_metadata(song_path, youtube_id=None):
-    title = os.path.basename(song_path).replace(".mp3", "")
-    duration = None
-
-    if filename_has_youtube_id(os.path.basename(song_path)):
-        title = strip_youtube_id_from_filename(os.path.basename(song_path))
-        youtube_id = get_youtube_id_from_filename(os.path.basename(song_path))
-
-    try:
-        audio = MP3(song_path)
-        duration = int(audio.info.length)
-    except Exception as e:
-        print(f"Could not read {song_path}: {e}")
-
-    return {
-        "title": title,
-        "duration": duration,
-        "path": song_path,
-        "youtube_id": youtube_id
-    }
-
 def get_songs():
-    songs = {}
-    for metadata in os.listdir(METADATA_DIR):
-        with open(f'{METADATA_DIR}/{metadata}', 'r', encoding='utf-8') as f:
-            songs[metadata[:-5]] = json.load(f)
-    return songs
+    return library.all()
 
 # ---- Music backend ----
 class MusicPlayer:
     def __init__(self, ui_queue):
-        self.playlist = []           # list of file paths
+        self.playlist = PlaylistQueue(tracks)  # track ids into the shared table
         self.index = 0
         self.ui_queue = ui_queue     # queue to send events to UI thread
         self.current_title = ""
         self.volume = 0.8
-        pygame.mixer.music.set_volume(self.volume)
+        self.presence_details = ""
+        self.clock = PlaybackClock()
+        # Frequently played tracks are kept decoded on disk; 0 disables the cache
+        pcm_cache_mb = settings.get("pcm_cache_mb", 1024)
+        self.pcm_cache = PCMCache(os.path.join(METADATA_DIR, "pcm_cache"), pcm_cache_mb * 1024 * 1024) if pcm_cache_mb else None
+        self.engine = PlaybackEngine(
+            crossfade=settings.get("crossfade_seconds", 0),
+            on_preloaded=lambda path: self.ui_queue.put(("track_preloaded", {"path": path})),
+            pcm_cache=self.pcm_cache,
+            end_event=TRACK_END_EVENT,
+            chunk_event=PCM_CHUNK_EVENT,
+            clock=self.clock
+        )
+        self.engine.set_volume(self.volume)
         self.is_online = True
         self.is_playing = False
         self.is_stopped = True
+        self.scanner = LibraryScanner(
+            self._on_scan_batch,
+            on_progress=lambda done, total: self.ui_queue.put(("scan_progress", {"done": done, "total": total})),
+            on_finished=self._on_scan_finished,
+            workers=settings.get("scan_workers") or None
+        )
+        self.watcher = LibraryWatcher(MUSIC_DIR, self._on_music_dir_changed)
+        self.downloads = DownloadManager(
+            DOWNLOAD_OPTS,
+            ui_queue,
+            os.path.join(METADATA_DIR, "download_queue.json"),
+            is_downloaded=lambda youtube_id: library.get_by_youtube_id(youtube_id) is not None,
+            on_complete=self._on_download_complete,
+            max_concurrent=settings.get("max_concurrent_downloads", 2)
+        )
+        # Edits to a saved or loaded playlist are journaled and folded into its file every N operations
+        self.playlist_compact_ops = settings.get("playlist_compact_ops", 500)
+        self.normalize_loudness = settings.get("normalize_loudness", True)
+        self.loudness = LoudnessAnalyzer(self._on_loudness_result, workers=settings.get("loudness_workers", 1))
+
+    # Runs on a download worker thread once yt-dlp has produced the file
+    def _on_download_complete(self, job, info, mp3_path):
+        # collect metadata
+        title = info.get("title") or sanitize_filename_for_display(mp3_path)
+        youtube_id = info.get("id")
+        duration = None
+        try:
+            duration = int(MP3(mp3_path).info.length)
+        except Exception:
+            duration = 0
 
-    # Blocking download routine — run in a background thread
-    def _download_worker(self, url):
-        ydl_opts = {
-            "format": "bestaudio[ext=m4a]/bestaudio/best",
-            "outtmpl": os.path.join(MUSIC_DIR, "%(title).200s-%(id)s.%(ext)s"),
-            "postprocessors": [{
-                "key": "FFmpegExtractAudio",
-                "preferredcodec": "mp3",
-                "preferredquality": "192",
-            }],
-            "quiet": False,
-            "noplaylist": False,
-            "nopart": True,
-            "geo_bypass": True,  # optional: bypass some region restrictions
-            "cookies": "cookies.txt",
-            "no-abort-on-error": True,
-            "ignoreerrors": True
+        entry = {
+            "title": title,
+            "youtube_id": youtube_id,
+            "path": mp3_path,
+            "duration": duration
         }
-        try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl: # type: ignore
-                info = ydl.extract_info(url, download=True)
-                # prepare_filename gives the file name used by outtmpl (before postprocessing ext change)
-                filename = ydl.prepare_filename(info)
-                mp3_path = os.path.splitext(filename)[0] + ".mp3"
-                if not os.path.exists(mp3_path):
-                    # postprocessor might have created a different name in rare setups; try to infer
-                    mp3_path = None
-                    for ext in (".mp3", ".m4a", ".aac"):
-                        candidate = os.path.splitext(filename)[0] + ext
-                        if os.path.exists(candidate):
-                            mp3_path = candidate
-                            break
-                if mp3_path:
-                    # collect metadata
-                    title = info.get("title") or sanitize_filename_for_display(mp3_path) # type: ignore
-                    youtube_id = info.get("id") # type: ignore
-                    duration = None
-                    try:
-                        duration = int(MP3(mp3_path).info.length)
-                    except Exception:
-                        duration = 0
-
-                    entry = {
-                        "title": title,
-                        "youtube_id": youtube_id,
-                        "path": mp3_path,
-                        "duration": duration
-                    }
-                    save_song_metadata(entry)
-                    self.playlist.append(entry)
-                    self.ui_queue.put(("download_complete", {"title": title}))
-                else:
-                    self.ui_queue.put(("download_failed", {"error": "file-not-found-after-download"}))
-        except Exception as e:
-            tb = traceback.format_exc()
-            self.ui_queue.put(("download_failed", {"error": str(e)}))
-        self.check_music_dir_for_new_songs()
+        already_indexed = library.has_path(mp3_path)
+        save_song_metadata(entry)
+        if not already_indexed:
+            self.playlist.append(entry)
+            self.analyze_tracks([mp3_path])
+        if not self.watcher.running:
+            self.check_music_dir_for_new_songs()
 
     def check_music_dir_for_new_songs(self):
+        # Only files the index has never seen are parsed; the scan itself runs on a worker pool
+        known_paths = library.paths()
+        new_paths = []
         for song in os.listdir(MUSIC_DIR):
             song_path = os.path.join(MUSIC_DIR, song)
-
-            if song.endswith(".mp3") and not check_for_metadata_file(song_path):
-                metadata = _get_song_metadata(song_path)
-                save_song_metadata(metadata)
-                self.playlist.append(metadata)
-                self.ui_queue.put(("song_added", {"title": metadata["title"]}))
+            if song.endswith(".mp3") and song_path not in known_paths:
+                new_paths.append(song_path)
+        if new_paths:
+            self.scanner.scan(new_paths)
+
+    def cancel_scan(self):
+        self.scanner.cancel()
+
+    def _on_scan_batch(self, entries):
+        # A download may have indexed the same file while it was being scanned
+        entries = [metadata for metadata in entries if not library.has_path(metadata["path"])]
+        if not entries:
+            return
+        library.put_many(entries)
+        if youtube_validator.running:
+            for metadata in entries:
+                youtube_validator.submit(metadata["youtube_id"])
+        self.playlist.extend(entries)
+        self.analyze_tracks([metadata["path"] for metadata in entries])
+        title = entries[0]["title"] if len(entries) == 1 else f"{len(entries)} songs"
+        self.ui_queue.put(("song_added", {"title": title, "count": len(entries)}))
+
+    def _on_scan_finished(self, count, cancelled):
+        if cancelled:
+            self.ui_queue.put(("scan_cancelled", {"count": count}))
+        else:
+            self.ui_queue.put(("scan_complete", {"count": count}))
+
+    def analyze_tracks(self, paths=None):
+        """
+        Queues tracks for loudness and waveform analysis. Without paths, every indexed track that has
+        no result yet is queued, which resumes an interrupted run.
+        """
+        if not ffmpeg_available():
+            return
+        if paths is None:
+            # Tracks analyzed before spectrograms were stored have no "spectrum" flag yet
+            paths = [metadata["path"] for metadata in library.all().values()
+                     if "waveform" not in metadata or "spectrum" not in metadata]
+        self.loudness.analyze(paths)
+
+    def _on_loudness_result(self, result):
+        # Failures are stored too, so a broken file is not retried on every start
+        path = result.pop("path")
+        spectrogram = result.pop("spectrogram", None)
+        if "error" in result:
+            print(f"Could not analyze {path}: {result['error']}")
+            result = {"loudness": None, "replaygain_db": None, "waveform": None}
+        result["spectrum"] = False
+        if spectrogram is not None:
+            try:
+                save_spectrogram(SPECTRA_DIR, path, spectrogram)
+                result["spectrum"] = True
+            except OSError as e:
+                print(f"Could not save the spectrogram of {path}: {e}")
+        library.update(path, **result)
+        self.ui_queue.put(("track_analyzed", {"path": path}))
+
+    def get_waveform(self, path):
+        # uint8 peaks for the progress bar, or None until the track has been analyzed
+        metadata = library.get_by_path(path)
+        return decode_waveform(metadata.get("waveform")) if metadata else None
+
+    def _track_gain(self, track):
+        # Attenuation only: the mixer cannot go past full volume
+        if not self.normalize_loudness:
+            return 1.0
+        metadata = library.get_by_path(track.path)
+        gain_db = metadata.get("replaygain_db") if metadata else None
+        if gain_db is None:
+            return 1.0
+        return min(1.0, 10 ** (gain_db / 20))
+
+    def watch_music_dir(self):
+        self.watcher.start()
+
+    def _on_music_dir_changed(self, created, deleted, moved):
+        for src, dest in moved:
+            metadata = library.get_by_path(src)
+            if metadata is None:
+                created.append(dest)
+                continue
+            library.remove(src)
+            metadata["path"] = dest
+            library.put(metadata)
+            self.playlist.rename_path(src, dest)
+
+        if deleted:
+            self.remove_songs(deleted)
+
+        # Files that were gone when the playlist loaded and have been put back
+        if tracks.restore(created + [dest for _, dest in moved]):
+            self.playlist.touch()
+
+        new_paths = [path for path in created if not library.has_path(path)]
+        if new_paths:
+            self.scanner.scan(new_paths)
+
+    def remove_songs(self, paths):
+        """
+        Drops deleted files from the index and from the loaded playlist without a rescan.
+        """
+        paths = set(paths)
+        for path in paths:
+            library.remove(path)
+        removed, removed_before = self.playlist.remove_paths(paths, before=self.index)
+        if not removed:
+            return
+        self.index = max(0, min(self.index - removed_before, len(self.playlist) - 1))
+        title = removed[0].title if len(removed) == 1 else f"{len(removed)} songs"
+        self.ui_queue.put(("song_removed", {"title": title, "count": len(removed)}))
 
     def load_song(self, title):
         metadata = load_song_metadata(title)
@@ -243,11 +369,10 @@ class MusicPlayer:
         self.playlist.append(metadata)
         self.ui_queue.put(("song_added", {"title": title}))
 
-    def download_async(self, url):
-        threading.Thread(target=self._download_worker, args=(url,), daemon=True).start()
+    def download_async(self, url, priority=0):
+        self.downloads.enqueue(url, priority)
 
     def play(self, index=None):
-        global RPCdata
         if index is not None:
             if 0 <= index < len(self.playlist):
                 self.index = index
@@ -255,46 +380,131 @@ class MusicPlayer:
                 return
         if not self.playlist:
             return
+        index = self._playable_index(self.index)
+        if index is None:
+            self.ui_queue.put(("play_error", {"error": "none of the songs in the playlist exist"}))
+            return
+        self.index = index
         track = self.playlist[self.index]
         try:
-            pygame.mixer.music.load(track["path"])
-            pygame.mixer.music.play()
-            self.current_title = track["title"]
-            self.ui_queue.put(("play_started", {"index": self.index + 1, "title": self.current_title}))
-            if self.is_online:
-                RPCdata = {
-                    "details": get_random_flavor_message(),
-                    "state": "Listening to " + self.current_title,
-                    "start": int(time.time()),
-                    "large_image": "resources/logo.png",
-                    "large_text": "Terra's Music Player",
-                    "small_image": "resources/logo.png",
-                    "small_text": "Terra's Music Player"
-                }
-            self.is_playing = True
-            self.is_stopped = False
+            self.engine.play(track.path, track.duration, gain=self._track_gain(track))
+            self._track_started(track)
         except Exception as e:
             self.ui_queue.put(("play_error", {"error": str(e)}))
 
+    def _track_started(self, track):
+        self.current_title = track.title
+        self.ui_queue.put(("play_started", {"index": self.index + 1, "title": self.current_title}))
+        self.presence_details = get_random_flavor_message()
+        self.is_playing = True
+        self.is_stopped = False
+        self._update_presence()
+        self.engine.prepare_next(self._next_path())
+
+    def position(self):
+        # Seconds into the current track, read from the playback clock
+        return self.clock.position()
+
+    def _update_presence(self):
+        # The start timestamp is derived from the clock, so Discord's elapsed time follows pauses and seeks
+        if not self.is_online or self.is_stopped:
+            return
+        data = {
+            "details": self.presence_details,
+            "state": ("Listening to " if self.is_playing else "Paused: ") + self.current_title,
+            "large_image": "resources/logo.png",
+            "large_text": "Terra's Music Player",
+            "small_image": "resources/logo.png",
+            "small_text": "Terra's Music Player"
+        }
+        if self.is_playing:
+            data["start"] = int(time.time() - self.position())
+        online_manager.set_presence(data)
+
+    def _playable_index(self, start):
+        # First track from start on whose file exists. Checked again even for flagged tracks, since
+        # a file may come back without the watcher seeing it; the flags are updated either way
+        count = len(self.playlist)
+        for offset in range(count):
+            index = (start + offset) % count
+            track = self.playlist[index]
+            exists = os.path.exists(track.path)
+            if track.missing == exists:
+                track.missing = not exists
+                self.playlist.touch()
+            if exists:
+                return index
+        return None
+
+    def _next_index(self):
+        if not self.playlist:
+            return None
+        # Runs every frame, so only look a bounded distance past flagged tracks
+        count = len(self.playlist)
+        for offset in range(1, min(count, 1000) + 1):
+            index = (self.index + offset) % count
+            if not self.playlist[index].missing:
+                return index
+        return (self.index + 1) % count
+
+    def _next_path(self):
+        next_index = self._next_index()
+        if next_index is None or len(self.playlist) < 2:
+            return None
+        return self.playlist[next_index].path
+
+    def poll_playback(self):
+        # Keeps the preloaded track in line with the queue (it may have been reordered) and drives fades
+        if not self.is_stopped:
+            self.engine.prepare_next(self._next_path())
+        self.engine.poll()
+
+    def on_track_end(self):
+        """
+        Handles the end event: if the engine already switched to the preloaded track only the
+        bookkeeping is left, otherwise fall back to loading the next track.
+        """
+        next_index = self._next_index()
+        next_track = self.playlist[next_index] if next_index is not None else None
+        path = self.engine.on_track_end(
+            next_track.duration if next_track else None,
+            self._track_gain(next_track) if next_track else 1.0
+        )
+        if path is None:
+            if self.is_stopped:
+                return
+            self.skip()
+            return
+        if next_track is None or next_track.path != path:
+            # Queue changed under us; follow what is actually playing
+            next_index = self.playlist.index_of(path)
+            if next_index is None:
+                self.skip()
+                return
+            self.engine.set_gain(self._track_gain(self.playlist[next_index]))
+        self.index = next_index
+        self._track_started(self.playlist[self.index])
+
     def pause(self):
         if self.is_playing:
             self.is_playing = False
-            pygame.mixer.music.pause()
+            self.engine.pause()
+            self._update_presence()
             self.ui_queue.put(("paused", {}))
 
     def resume(self):
         if not self.is_playing and not self.is_stopped:
             self.is_playing = True
-            pygame.mixer.music.unpause()
+            self.engine.resume()
+            self._update_presence()
             self.ui_queue.put(("resumed", {}))
 
     def stop(self):
-        global RPCdata
         if not self.is_stopped:
             self.is_playing = False
             self.is_stopped = True
-            pygame.mixer.music.stop()
-            RPCdata = RPCDefault
+            self.engine.stop()
+            online_manager.set_presence(RPCDefault)
             self.ui_queue.put(("stopped", {}))
 
     def skip(self):
@@ -305,9 +515,15 @@ class MusicPlayer:
             self.index = 0
         self.play(self.index)
 
+    def seek(self, seconds):
+        if self.is_stopped:
+            return
+        self.engine.seek(seconds)
+        self._update_presence()
+
     def set_volume(self, v):  # v in 0..1
         self.volume = max(0.0, min(1.0, v))
-        pygame.mixer.music.set_volume(self.volume)
+        self.engine.set_volume(self.volume)
         self.ui_queue.put(("volume", {"volume": int(self.volume*100)}))
 
     def save_playlist(self, name):
@@ -316,8 +532,13 @@ class MusicPlayer:
             return
         path = os.path.join(PLAYLIST_DIR, f"{name}.json")
         try:
-            with open(path, "w", encoding="utf-8") as f:
-                json.dump(self.playlist, f, indent=2)
+            # Writes a fresh snapshot past any old journal, then keeps journaling edits to it
+            journal = PlaylistJournal(path, self.playlist_compact_ops)
+            journal.pending()
+            queue = self.playlist
+            with queue.lock:
+                journal.compact(queue.to_dicts())
+                queue.journal = journal
             self.ui_queue.put(("save_ok", {"name": name}))
         except Exception as e:
             self.ui_queue.put(("save_failed", {"error": str(e)}))
@@ -327,23 +548,120 @@ class MusicPlayer:
             self.ui_queue.put(("load_failed", {"name": "empty-name"}))
             return
         path = os.path.join(PLAYLIST_DIR, f"{name}.json")
+        if not os.path.isfile(path):
+            self.ui_queue.put(("load_failed", {"error": f"no playlist named {name}"}))
+            return
+        # The queue is swapped in empty and filled from a background thread
+        queue = PlaylistQueue(tracks)
+        self.playlist = queue
+        self.index = 0
+        threading.Thread(target=self._stream_playlist, args=(name, path, queue), daemon=True).start()
+
+    def _stream_playlist(self, name, path, queue):
+        journal = PlaylistJournal(path, self.playlist_compact_ops)
         try:
-            with open(path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            # keep only files that exist
-            self.playlist = [d for d in data if os.path.exists(d["path"])]
-            self.index = 0
-            self.ui_queue.put(("load_ok", {"name": name, "count": len(self.playlist)}))
+            ops = journal.pending()
+            if ops:
+                # Edits left over from the last session: replay them onto the snapshot and fold them in
+                entries = [entry for entry in iter_tracks(path) if isinstance(entry, dict) and entry.get("path")]
+                for op in ops:
+                    apply_op(entries, op)
+                journal.compact(entries)
+                with queue.lock:
+                    queue.extend(entries)
+                    version = queue.version
+                edited = False
+            else:
+                edited, version = self._stream_entries(path, queue)
         except Exception as e:
             self.ui_queue.put(("load_failed", {"error": str(e)}))
+            return
+        if self.playlist is not queue:
+            return
+        with queue.lock:
+            if edited or queue.version != version:
+                # The queue was changed while loading; those edits are not in the journal
+                journal.compact(queue.to_dicts())
+            queue.journal = journal
+        self.ui_queue.put(("load_ok", {"name": name, "count": len(queue)}))
+        self._check_missing(name, queue)
+
+    def _stream_entries(self, path, queue):
+        """
+        Feeds the snapshot into the queue in growing batches; the small first batch lets the first
+        tracks show up and play right away.
+
+        :return: (whether the queue was edited by something else in the meantime, queue version
+            after the last batch).
+        """
+        batch = []
+        batch_size = 16
+        version = queue.version
+        edited = False
+        try:
+            for entry in iter_tracks(path):
+                if self.playlist is not queue:
+                    return edited, version  # replaced by a newer load
+                if isinstance(entry, dict) and entry.get("path"):
+                    batch.append(entry)
+                if len(batch) >= batch_size:
+                    with queue.lock:
+                        edited = edited or queue.version != version
+                        queue.extend(batch)
+                        version = queue.version
+                    batch = []
+                    batch_size = min(batch_size * 4, 4096)
+        except Exception:
+            # Keep what was read before the damage
+            queue.extend(batch)
+            raise
+        with queue.lock:
+            edited = edited or queue.version != version
+            queue.extend(batch)
+            return edited, queue.version
+
+    def flush_playlist(self):
+        # Folds the journal into the playlist file, e.g. on exit; this also writes out the
+        # operations still queued for the journal's writer thread
+        queue = self.playlist
+        journal = queue.journal
+        if journal is not None and journal.dirty():
+            try:
+                with queue.lock:
+                    journal.compact(queue.to_dicts())
+            except OSError as e:
+                print(f"Could not save playlist {journal.name}: {e}")
+
+    def _check_missing(self, name, queue):
+        """
+        Flags queued tracks whose file is gone. Missing tracks stay in the queue and in the saved
+        playlist, they are only skipped during playback.
+        """
+        missing = 0
+        changed = False
+        for i, track in enumerate(list(queue)):
+            if self.playlist is not queue:
+                return
+            exists = os.path.exists(track.path)
+            if track.missing == exists:
+                track.missing = not exists
+                changed = True
+            missing += not exists
+            if changed and i % 256 == 255:
+                queue.touch()
+                changed = False
+        if changed:
+            queue.touch()
+        if missing:
+            self.ui_queue.put(("load_missing", {"name": name, "count": missing}))
 
 
 class PlaylistWidget(Widget):
+    live_state = ("player", "scroll", "selected")
+
     def __init__(self, rect, style, font, font_size, player: Optional[MusicPlayer] = None, name = ""):
-        self.name = name
-        self.rect = pygame.Rect(rect)
-        self.style = style or {}
-        self.font = pygame.font.SysFont(font or None, font_size)
+        super().__init__(rect, style or {}, name)
+        self.font = get_font(font, font_size)
         self.player = player
         self.item_height = max(20, self.font.get_linesize() + 4)
         self.selected = 0
@@ -351,40 +669,72 @@ class PlaylistWidget(Widget):
         self.dragging = None
         self.shift_down = False
         self.debounce = False
+        # Rendered rows keyed by (index, title, duration, selected, missing), valid for one playlist version
+        self.row_cache: dict[tuple, pygame.Surface] = {}
+        self.row_cache_version = None
+        # The composed widget, reused as long as nothing it shows has changed
+        self.surface = None
+        self.surface_key = None
 
     def set_player(self, player: MusicPlayer):
         self.player = player
 
+    def _surface_key(self):
+        return (self._playlist_version(), self.scroll, self.player.index, self.rect.size) # type: ignore
+
+    def needs_redraw(self):
+        return super().needs_redraw() or self.player is None or self._surface_key() != self.surface_key
+
+    def _playlist_version(self):
+        playlist = self.player.playlist # type: ignore
+        return (id(playlist), getattr(playlist, "version", None))
+
+    def _render_row(self, i, entry, selected, bg, fg, sel_bg):
+        title = entry.title
+        dur = entry.duration or 0
+        key = (i, title, dur, selected, entry.missing)
+        row = self.row_cache.get(key)
+        if row is None:
+            mins, secs = divmod(dur, 60)
+            if entry.missing:
+                fg = tuple(self.style.get("missing_fg", (120, 120, 120)))
+            row = pygame.Surface((self.rect.w, self.item_height))
+            row.fill(sel_bg if selected else bg)
+            row.blit(self.font.render(f"{i+1}. {title} [{mins}:{secs:02d}]", True, fg), (4, 0))
+            self.row_cache[key] = row
+        return row
+
     def draw(self, surface):
+        version = self._playlist_version()
+        key = self._surface_key()
+        if self.surface is not None and key == self.surface_key:
+            surface.blit(self.surface, self.rect.topleft)
+            return
+
+        if version != self.row_cache_version or len(self.row_cache) > 1024:
+            self.row_cache = {}
+            self.row_cache_version = version
+        if self.surface is None or self.surface.get_size() != self.rect.size:
+            self.surface = pygame.Surface(self.rect.size)
+
         bg = tuple(self.style.get("bg_color", (30, 30, 30)))
         fg = tuple(self.style.get("fg_color", (230, 230, 230)))
         sel_bg = tuple(self.style.get("selected_bg", (80, 80, 120)))
-        pygame.draw.rect(surface, bg, self.rect)
-        # clip drawing to widget rect
-        clip = surface.get_clip()
-        surface.set_clip(self.rect)
-        x, y = self.rect.x + 4, self.rect.y + 4
+        self.surface.fill(bg)
+        y = 4
         visible = self.rect.h // self.item_height
-        for i in range(self.scroll, min(len(self.player.playlist), self.scroll + visible)): # type: ignore
+        playlist = self.player.playlist # type: ignore
+        for i in range(self.scroll, min(len(playlist), self.scroll + visible)):
             try:
-                entry = self.player.playlist[i] # type: ignore
+                entry = playlist[i]
             except IndexError:
                 break
-            title = entry["title"]
-            dur = entry.get("duration", 0)
-            mins, secs = divmod(dur, 60)
-            text = f"{i+1}. {title} [{mins}:{secs:02d}]"
-
-            item_rect = pygame.Rect(self.rect.x, y, self.rect.w, self.item_height)
-            if i == self.player.index: # type: ignore
-                pygame.draw.rect(surface, sel_bg, item_rect)
-
-            txtsurf = self.font.render(text, True, fg)
-            surface.blit(txtsurf, (x, y))
+            self.surface.blit(self._render_row(i, entry, i == self.player.index, bg, fg, sel_bg), (0, y)) # type: ignore
             y += self.item_height
-        surface.set_clip(clip)
         # border
-        pygame.draw.rect(surface, (0,0,0), self.rect, 2)
+        pygame.draw.rect(self.surface, (0,0,0), self.surface.get_rect(), 2)
+        self.surface_key = key
+        surface.blit(self.surface, self.rect.topleft)
 
     def handle_event(self, event):
 
@@ -405,8 +755,7 @@ class PlaylistWidget(Widget):
             local_y = event.pos[1] - self.rect.y
             new_idx = self.scroll + (local_y // self.item_height)
             if 0 <= new_idx < len(self.player.playlist): # type: ignore
-                item = self.player.playlist.pop(self.dragging) # type: ignore
-                self.player.playlist.insert(new_idx, item) # type: ignore
+                self.player.playlist.move(self.dragging, new_idx) # type: ignore
             self.dragging = None
         elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 3:
             if self.rect.collidepoint(event.pos):
@@ -431,9 +780,9 @@ class PlaylistWidget(Widget):
                         return
                     
                     if platform.system() == "Windows":
-                        subprocess.Popen(f'explorer /select,"{entry["path"]}"')
+                        subprocess.Popen(f'explorer /select,"{entry.path}"')
                     else:
-                        subprocess.Popen(["xdg-open", os.path.dirname(entry["path"])])
+                        subprocess.Popen(["xdg-open", os.path.dirname(entry.path)])
                     
                     # Spawn a thread to avoid blocking
                     
@@ -447,11 +796,15 @@ class PlaylistWidget(Widget):
                 self.scroll = min(len(self.player.playlist) - (self.rect.h // self.item_height), self.scroll + 1) # type: ignore
 
 class SearchBoxWidget(Widget):
+    live_state = ("items", "index", "results", "results_query", "query", "scroll", "selected", "state")
+
     def __init__(self, rect, style, font, font_size, item_height: int, items: dict[str, Any] = {}, name = "", search_event = ""):
         super().__init__(rect, style, name)
-        self.font = pygame.font.SysFont(font or None, font_size)
+        self.font = get_font(font, font_size)
         self.items = items
-        self.visible_items = {}
+        self.index = SearchIndex(items)
+        self.results: list[str] = list(items)  # keys matching the query, in display order
+        self.results_query = ""
         self.query = ""
         self.selected = -1
         self.item_height = item_height
@@ -459,16 +812,29 @@ class SearchBoxWidget(Widget):
         self.search_rect = pygame.Rect(self.rect.x + 4, self.rect.y + 4, self.rect.w, item_height)
         self.search_event = search_event
         self.scroll = 0
-        self.cursor_timer = 0
+        self.cursor_visible = True
         self.mod = {
             "backspace": False
         }
 
     def set_items(self, items: dict[str, Any]):
         self.items = items
+        self.index = SearchIndex(items)
+        self.results_query = None
+        self.refresh_results()
+
+    def needs_redraw(self):
+        # The blinking cursor animates while the box has focus
+        return super().needs_redraw() or (self.active and cursor_blink_on() != self.cursor_visible)
+
+    def refresh_results(self):
+        # Only re-query when the text actually changed since the last lookup
+        if self.query != self.results_query:
+            self.results = self.index.query(self.query)
+            self.results_query = self.query
 
     def draw(self, surface):
-        self.visible_items = {}
+        self.refresh_results()
         # Draw first item as search box, then draw all other items
         bg = tuple(self.style.get("bg_color", (30, 30, 30)))
         fg = tuple(self.style.get("fg_color", (230, 230, 230)))
@@ -476,42 +842,31 @@ class SearchBoxWidget(Widget):
         pygame.draw.rect(surface, bg, self.rect)
         # clip drawing to widget rect
         clip = surface.get_clip()
-        surface.set_clip(self.rect)
+        surface.set_clip(self.rect.clip(clip))
         x, y = self.rect.x + 4, self.rect.y + 4
 
         # search box
         pygame.draw.rect(surface, tuple(self.style.get("search_box_color", (50, 50, 50))), self.search_rect)
-        txtsurf = self.font.render(self.query or "Search", True, fg)
+        txtsurf = render_text(self.font, self.query or "Search", fg)
         surface.blit(txtsurf, (x, y))
         # blinking cursor
+        self.cursor_visible = cursor_blink_on()
         if self.active:
-            self.cursor_timer = (self.cursor_timer + 1) % 60
-            if self.cursor_timer < 30:
+            if self.cursor_visible:
                 cursor_x = self.search_rect.x + txtsurf.get_width() + 2
                 cursor_y = self.search_rect.y + 1
                 pygame.draw.line(surface, fg, (cursor_x, cursor_y), (cursor_x, cursor_y + txtsurf.get_height()), 2)
         y += self.item_height
 
         visible = (self.rect.h // self.item_height) - 1
-        range(self.scroll, min(len(self.items), self.scroll + visible))
-
-        for i, (text, item) in enumerate(self.items.items()):
-
-            if not self.query.lower() in text.lower():
-                continue
-            
-            self.visible_items[text] = item
 
-        for i in range(self.scroll, min(len(self.visible_items), self.scroll + visible)):
-            try:
-                text = list(self.visible_items.keys())[i]
-            except IndexError:
-                break
+        for i in range(self.scroll, min(len(self.results), self.scroll + visible)):
+            text = self.results[i]
             item_rect = pygame.Rect(self.rect.x, y, self.rect.w, self.item_height)
             if i == self.selected:
                 pygame.draw.rect(surface, sel_bg, item_rect)
 
-            txtsurf = self.font.render(text, True, fg)
+            txtsurf = render_text(self.font, text, fg)
             surface.blit(txtsurf, (x, y))
             y += self.item_height
         surface.set_clip(clip)
@@ -541,18 +896,23 @@ class SearchBoxWidget(Widget):
                 self.mod["backspace"] = True
                 self._backspace_helper()
             elif event.key == pygame.K_RETURN:
-                if self.selected >= 0:
+                self.refresh_results()
+                if 0 <= self.selected < len(self.results):
                     self.active = False
-                    self.query = list(self.items.keys())[self.selected]
+                    self.query = self.results[self.selected]
                     self.selected = -1
                     GlobalEventRegistry.dispatch(Event(self.search_event, {"query": self.query, "state": self.state}))
                     return
             elif event.key == pygame.K_ESCAPE:
                 self.active = False
             elif event.key == pygame.K_DOWN:
-                self.selected = (self.selected + 1) % len(self.items)
+                self.refresh_results()
+                if self.results:
+                    self.selected = (self.selected + 1) % len(self.results)
             elif event.key == pygame.K_UP:
-                self.selected = (self.selected - 1) % len(self.items)
+                self.refresh_results()
+                if self.results:
+                    self.selected = (self.selected - 1) % len(self.results)
             else:
                 self.query += event.unicode
                 self.scroll = 0
@@ -567,104 +927,373 @@ class SearchBoxWidget(Widget):
             else:
                 self.active = False
 
+            self.refresh_results()
             local_y = event.pos[1] - self.rect.y
             idx = self.selected + (local_y // self.item_height)
-            if 0 <= idx < len(self.visible_items) and self.rect.collidepoint(event.pos):
-                GlobalEventRegistry.dispatch(Event(self.search_event, {"query": list(self.visible_items)[idx + self.scroll], "state": self.state}))
+            if 0 <= idx + self.scroll < len(self.results) and idx >= 0 and self.rect.collidepoint(event.pos):
+                GlobalEventRegistry.dispatch(Event(self.search_event, {"query": self.results[idx + self.scroll], "state": self.state}))
         elif event.type == pygame.MOUSEWHEEL and self.rect.collidepoint(pygame.mouse.get_pos()):
-            if len(self.visible_items) <= (self.rect.h // self.item_height):
+            self.refresh_results()
+            if len(self.results) <= (self.rect.h // self.item_height):
                 return
             if event.y > 0:
                 self.scroll = max(0, self.scroll - 1)
             elif event.y < 0:
-                self.scroll = min(len(self.visible_items) - ((self.rect.h // self.item_height) - 1), self.scroll + 1)
+                self.scroll = min(len(self.results) - ((self.rect.h // self.item_height) - 1), self.scroll + 1)
 
 class ProgressBar(Widget):
-    def __init__(self, rect, style, name = ""):
+    """
+    Flat progress bar, or a waveform overview once set_waveform() has been given the track's peaks.
+    With ``seekable`` a click fires ``fire_event`` with the clicked position in percent.
+    """
+    live_state = ("progress", "enabled", "waveform")
+
+    def __init__(self, rect, style, name = "", enabled = True, seekable = False, fire_event = ""):
         super().__init__(rect, style, name)
         self.progress = 0.0 # 0-100
-        self.enabled = True
-    
+        self.enabled = enabled
+        self.seekable = seekable
+        self.callback = fire_event
+        self.drawn_width = None
+        self.waveform = None
+        self.wave_surfaces = None  # (unplayed, played), rendered once per waveform
+
+    def _fill_width(self):
+        return int(self.rect.w * self.progress / 100)
+
+    def set_waveform(self, peaks):
+        """
+        :param peaks: uint8 peak per bin (bytes), or None for the flat bar.
+        """
+        if peaks == self.waveform:
+            return
+        self.waveform = peaks
+        self.wave_surfaces = None
+        self.mark_dirty()
+
+    def _render_waveform(self):
+        bg = tuple(self.style.get("bg_color", (30, 30, 30)))
+        fg = tuple(self.style.get("fg_color", (230, 230, 230)))
+        wave = tuple(self.style.get("wave_color", (90, 90, 90)))
+        w, h = self.rect.size
+        peaks = np.frombuffer(self.waveform, dtype=np.uint8)
+        # One peak per pixel column, taken from the bin under it
+        heights = np.maximum(1, peaks[np.arange(w) * len(peaks) // w].astype(np.int32) * h // 255)
+        tops = (h - heights) // 2
+        surfaces = []
+        for color in (wave, fg):
+            surface = pygame.Surface((w, h))
+            surface.fill(bg)
+            for x, (top, height) in enumerate(zip(tops.tolist(), heights.tolist())):
+                surface.fill(color, (x, top, 1, height))
+            surfaces.append(surface)
+        self.wave_surfaces = tuple(surfaces)
+
+    def needs_redraw(self):
+        # Progress changes every frame, but only a change in filled pixels is worth a redraw
+        return super().needs_redraw() or (self.enabled and self._fill_width() != self.drawn_width)
+
+    def handle_event(self, event):
+        if not (self.seekable and self.enabled and self.callback):
+            return
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and self.rect.collidepoint(event.pos):
+            percent = (event.pos[0] - self.rect.x) * 100 / self.rect.w
+            GlobalEventRegistry.dispatch(Event(self.callback, {"value": percent}))
+
     def draw(self, surface):
         if not self.enabled:
             return
+        self.drawn_width = self._fill_width()
+        if self.waveform:
+            if self.wave_surfaces is None or self.wave_surfaces[0].get_size() != self.rect.size:
+                self._render_waveform()
+            unplayed, played = self.wave_surfaces # type: ignore
+            surface.blit(unplayed, self.rect)
+            surface.blit(played, self.rect, (0, 0, self.drawn_width, self.rect.h))
+            return
         bg = tuple(self.style.get("bg_color", (30, 30, 30)))
         fg = tuple(self.style.get("fg_color", (230, 230, 230)))
-        progress = self.progress / 100
         pygame.draw.rect(surface, bg, self.rect)
-        pygame.draw.rect(surface, fg, (self.rect.x, self.rect.y, self.rect.w * progress, self.rect.h))
+        pygame.draw.rect(surface, fg, (self.rect.x, self.rect.y, self.drawn_width, self.rect.h))
     
         # border
         pygame.draw.rect(surface, (0,0,0), self.rect, 2)
 
+class Visualizer(Widget):
+    """
+    Spectrum bars for the playing track.
+
+    Fed once per frame through update(player) from the main loop. Bars are drawn into a surface
+    owned by the widget and reused every frame; when an update costs more than ``budget_ms`` the
+    widget refreshes only every few frames until it is back within budget.
+    """
+    def __init__(self, rect, style, name = "", bars = 48, budget_ms = 1.0):
+        super().__init__(rect, style, name)
+        self.analyzer = SpectrumAnalyzer(bars, spectra_dir=SPECTRA_DIR)
+        self.surface = pygame.Surface(self.rect.size)
+        bar_width = self.rect.w / self.analyzer.bar_count
+        self.bar_rects = [pygame.Rect(int(i * bar_width), 0, max(1, int(bar_width) - 1), 0) for i in range(self.analyzer.bar_count)]
+        self.budget = budget_ms / 1000
+        self.cost = 0.0     # smoothed seconds per update
+        self.stride = 1     # update every stride-th frame
+        self.frame = 0
+        self.active = False
+
+    def is_active(self):
+        # Playing, or still letting the bars fall after a pause or stop
+        return self.active
+
+    def update(self, player):
+        path = player.engine.current if not player.is_stopped else None
+        self.analyzer.load(path, player.pcm_cache)
+        # Bars below one pixel are settled; one last frame is drawn after they settle
+        active = (player.is_playing and self.analyzer.ready) or self.analyzer.peak * self.rect.h >= 1
+        if not active and not self.active:
+            return
+        self.active = active
+        self.frame += 1
+        if self.frame % self.stride:
+            return
+
+        start = time.perf_counter()
+        levels = self.analyzer.levels_at(player.position()) if player.is_playing else self.analyzer.levels_at(-1)
+        bg = self.style.get("bg_color", (30, 30, 30))
+        fg = self.style.get("fg_color", (180, 180, 180))
+        height = self.rect.h
+        self.surface.fill(bg)
+        for bar, level in zip(self.bar_rects, levels):
+            bar.h = int(level * height)
+            if bar.h:
+                bar.y = height - bar.h
+                self.surface.fill(fg, bar)
+        self.dirty = True
+
+        self.cost = self.cost * 0.9 + (time.perf_counter() - start) * 0.1
+        if self.cost > self.budget and self.stride < 4:
+            self.stride += 1
+        elif self.cost < self.budget / 2 and self.stride > 1:
+            self.stride -= 1
+
+    def draw(self, surface):
+        if not self.visible:
+            return
+        surface.blit(self.surface, self.rect)
+
 # A class to manage online actions and allow for offline use.
 class OnlineManager:
-    def __init__(self):
+    """
+    Connectivity monitor and Discord presence updater on one background thread.
+
+    Connectivity is checked with a plain TCP connect to ``probe_address`` (no DNS, no HTTP).
+    While online the probe runs every ``online_interval`` seconds; while offline it backs off
+    exponentially up to ``max_backoff``. Between probes the thread sleeps until set_presence()
+    or stop() wakes it.
+
+    Presence is only sent when it differs from what Discord last received, and never more than
+    ``rate_limit`` updates per ``rate_window`` seconds; changes inside the window are coalesced
+    into the latest one.
+    """
+    def __init__(self, probe_address=("1.1.1.1", 53), probe_timeout=1.0, online_interval=30.0,
+                 max_backoff=60.0, rate_limit=5, rate_window=20.0):
         self.online = True
+        self.running = False
+        self.probe_address = tuple(probe_address)
+        self.probe_timeout = probe_timeout
+        self.online_interval = online_interval
+        self.max_backoff = max_backoff
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.backoff = 1.0
+        self.next_probe = 0.0
+        self.presence = RPCDefault
+        self.sent_presence = None
+        self.sent_times = collections.deque()
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+
+    def set_presence(self, data):
+        """
+        Sets the presence to show; sent from the background thread when it changed.
+        """
+        with self.lock:
+            self.presence = data
+        self.wake.set()
+
+    def init_connection_loop(self):
         self.running = True
+        threading.Thread(target=self._connection_loop).start()
+
+    def stop(self):
+        self.running = False
+        self.wake.set()
 
     def _connection_loop(self):
         while self.running:
-            self.check_status()
-            if not self.is_online():
-                if rpc.Connected:
-                    rpc._close()
-                continue
+            now = time.monotonic()
+            if now >= self.next_probe:
+                self.check_status()
+                self.next_probe = time.monotonic() + (self.online_interval if self.online else self.backoff)
+
+            wait = self.next_probe - time.monotonic()
+            if self.online:
+                wait = min(wait, self._sync_presence())
+
+            self.wake.wait(max(0.0, wait))
+            self.wake.clear()
 
+        if rpc is not None and rpc.Connected:
+            try:
+                rpc._close()
+            except Exception:
+                pass
+
+    def _sync_presence(self):
+        """
+        Sends the presence if it changed and the rate limit allows.
+
+        :return: Seconds until another attempt is useful.
+        """
+        with self.lock:
+            presence = self.presence
+        if presence == self.sent_presence:
+            return self.online_interval
+
+        now = time.monotonic()
+        while self.sent_times and now - self.sent_times[0] >= self.rate_window:
+            self.sent_times.popleft()
+        if len(self.sent_times) >= self.rate_limit:
+            return self.sent_times[0] + self.rate_window - now
+
+        global rpc
+        try:
+            if rpc is None:
+                rpc = RPCWraper()
             if not rpc.Connected:
                 rpc._connect()
-
-            if RPCdata:
-                rpc.update(**RPCdata)
+            if presence:
+                rpc.update(**presence)
             else:
                 rpc.clear()
-            time.sleep(1)
-
-    def init_connection_loop(self):
-        threading.Thread(target=self._connection_loop).start()
+        except Exception as e:
+            # Discord not running or the pipe broke; retry later with backoff, like a network failure
+            print(f"Presence update failed: {e}")
+            if rpc is not None and rpc.Connected:
+                try:
+                    rpc._close()
+                except Exception:
+                    pass
+            delay = self.backoff
+            self.backoff = min(self.max_backoff, self.backoff * 2)
+            return delay
+        self.sent_presence = presence
+        self.sent_times.append(now)
+        self.backoff = 1.0
+        return self.online_interval
 
     def check_status(self):
         try:
-            requests.get("https://www.google.com", timeout=1)
+            socket.create_connection(self.probe_address, timeout=self.probe_timeout).close()
             if not self.online:
                 print("Online")
             self.online = True
-        except Exception:
+            self.backoff = 1.0
+        except OSError:
             if self.online:
                 print("Offline")
+                self.backoff = 1.0
+            else:
+                self.backoff = min(self.max_backoff, self.backoff * 2)
             self.online = False
+            if rpc is not None and rpc.Connected:
+                try:
+                    rpc._close()
+                except Exception:
+                    pass
+            # Resend once back online
+            self.sent_presence = None
     
     def is_online(self):
         return self.online
-    
-# Register custom widgets
-UI_Loader.register_widget_type("SearchBox", SearchBoxWidget)
-UI_Loader.register_widget_type("ProgressBar", ProgressBar)
-UI_Loader.register_widget_type("PlaylistWidget", PlaylistWidget)
+
+online_manager = OnlineManager(settings.get("connectivity_probe", ("1.1.1.1", 53)))
+
+def create_ui_loader():
+    loader = JSONUILoader(UI_DIR, STYLES_FILE)
+    # Register custom widgets
+    loader.register_widget_type("SearchBox", SearchBoxWidget)
+    loader.register_widget_type("ProgressBar", ProgressBar)
+    loader.register_widget_type("PlaylistWidget", PlaylistWidget)
+    loader.register_widget_type("Visualizer", Visualizer)
+    return loader
+
+def check_for_update(ui_queue):
+    # Runs on a background thread after the first frame; every request has a timeout
+    try:
+        local_ver = updater.get_local_version()
+        remote_ver = updater.get_remote_version(timeout=settings.get("update_timeout", 5))
+    except Exception as e:
+        print(f"Update check failed: {e}")
+        return
+    print(f"Local version: {local_ver} | Remote version: {remote_ver}")
+    if local_ver == remote_ver:
+        return
+    # Only staged here; the running files are replaced on the next start, see the top of this file
+    if updater.pending_version() != remote_ver:
+        ui_queue.put(("update_started", {"version": remote_ver}))
+        try:
+            updater.stage_update(timeout=settings.get("update_timeout", 5))
+        except Exception as e:
+            ui_queue.put(("update_failed", {"error": str(e)}))
+            return
+    ui_queue.put(("update_installed", {"version": remote_ver}))
 
 # ---- Main UI assembly ----
 def main():
+    global UI_Loader
+    # Staged startup: window, UI and the cached library come first, everything that may touch
+    # the network or the disk at length starts in the background after the first frame
+    startup = StartupTimer(os.path.join(METADATA_DIR, "startup_times.jsonl"), STARTUP_STARTED)
+    startup.mark("imports")
+
     running = True
+    pygame.display.init()
+    pygame.font.init()
     screen = pygame.display.set_mode((800, 480))
     pygame.display.set_caption("Terrable Music Player")
-    clock = pygame.time.Clock()
-
-    # Load styles (optional)
-    try:
-        style_mgr = StyleManager(STYLES_FILE)
-    except Exception:
-        style_mgr = None
+    screen.fill(BACKGROUND_COLOR)
+    pygame.display.flip()
+    scheduler = FrameScheduler(settings.get("max_fps", 60))
+    startup.mark("window")
 
+    UI_Loader = create_ui_loader()
     ui = UI_Loader.load_scene("main")
-    ui_queue = queue.Queue()
+    startup.mark("ui")
+
+    pygame.init()
+    pygame.mixer.init()
+    pygame.mixer.music.set_endevent(TRACK_END_EVENT)
+    startup.mark("audio")
+
+    ui_queue = WakeQueue(UI_WAKE_EVENT)
+    open_library()
     player = MusicPlayer(ui_queue)
-    player.check_music_dir_for_new_songs()
-    online_manager = OnlineManager()
-    online_manager.init_connection_loop()
     playlists = get_playlists()
-        
     ui.named_widgets["playlist"].set_player(player)
     ui.named_widgets["name_box"].set_items(playlists)
+    startup.mark("library")
+
+    def start_background_work():
+        if settings.get("auto_update_on_start", True):
+            threading.Thread(target=check_for_update, args=(ui_queue,), daemon=True).start()
+        online_manager.init_connection_loop()
+        if settings.get("validate_youtube_ids", False):
+            youtube_validator.start()
+        # Listing the music folder can be slow on large or network drives
+        threading.Thread(target=player.check_music_dir_for_new_songs, daemon=True).start()
+        if settings.get("watch_music_dir", True):
+            player.watch_music_dir()
+        player.downloads.start()
+        threading.Thread(target=player.analyze_tracks, daemon=True).start()
 
     # Helper functions for UI events
     def on_download():
@@ -675,7 +1304,6 @@ def main():
         urls = [u.strip() for u in urls_text.splitlines() if u.strip()]
         for url in urls:
             player.download_async(url)
-        ui_queue.put(("download_started", {}))
         # clear input
         ui.named_widgets["url_box"].text = ""
 
@@ -705,7 +1333,7 @@ def main():
 
     def on_shuffle():
         if player.playlist:
-            random.shuffle(player.playlist)
+            player.playlist.shuffle()
             player.index = 0
             player.play()
 
@@ -720,27 +1348,58 @@ def main():
 
     GlobalEventRegistry.register("volume_slider_changed", callback=(lambda value: player.set_volume(value/100)))
 
+    def on_seek(value: float):
+        # value is the clicked position on the progress bar in percent
+        if player.playlist and player.index < len(player.playlist):
+            duration = player.playlist[player.index].duration or 0
+            if duration > 0:
+                player.seek(duration * value / 100)
+
+    GlobalEventRegistry.register("seek_requested", callback=on_seek)
+
     GlobalEventRegistry.register("shuffle_button_pressed", callback=on_shuffle)
     
     # UI loop
     
     pygame.scrap.init()
+    retained = settings.get("retained_rendering", True)
+    full_redraw = True
+    show_frame_stats = False
+    waveform_path = None  # track whose waveform the progress bar shows
+    shown_second = None   # (track, playback second) the progress bar shows
     while running:
-        for event in pygame.event.get():
+        for event in scheduler.get_events():
             if event.type == pygame.QUIT:
                 running = False
-                online_manager.running = False
+                online_manager.stop()
+                youtube_validator.stop()
+                player.cancel_scan()
+                player.watcher.stop()
+                player.downloads.stop()
+                player.loudness.stop()
+                player.flush_playlist()
+                if player.pcm_cache is not None:
+                    player.pcm_cache.flush()
+            elif event.type == UI_WAKE_EVENT:
+                # background message, drained below
+                continue
+            elif event.type == PCM_CHUNK_EVENT:
+                # queue the next chunk of a cached track
+                player.engine.on_chunk_end()
             elif event.type == TRACK_END_EVENT:
-                # automatic skip when track ends
-                player.skip()
+                # the engine has usually started the preloaded track already
+                player.on_track_end()
             else:
                 if event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_BACKQUOTE:
-                        # Reload styles and UI
-                        UI_Loader.reload_scenes()
-                        ui = UI_Loader.load_scene("main")
-                        ui.named_widgets["playlist"].set_player(player)
-                        ui.named_widgets["name_box"].set_items(playlists)
+                        # Reload changed styles and scenes, rebuilding only the widgets that changed
+                        if "main" in UI_Loader.reload_scenes():
+                            UI_Loader.reload_ui(ui)
+                        full_redraw = True
+                    elif event.key == pygame.K_F3:
+                        show_frame_stats = not show_frame_stats
+                elif event.type in (pygame.WINDOWEXPOSED, pygame.VIDEOEXPOSE):
+                    full_redraw = True
                 # forward to UI manager and playlist widget
                 ui.handle_event(event)
                 ui.named_widgets["playlist"].handle_event(event)
@@ -748,9 +1407,12 @@ def main():
         # Process messages from background threads
 
         status_messages = {
-            "download_complete": "Downloaded: {title}",
+            "download_complete": "Downloaded: {title} ({pending} left)",
             "download_failed": "Download failed: {error}",
-            "download_started": "Downloading...",
+            "download_started": "Downloading {title}... ({pending} queued)",
+            "download_queued": "Queued {title} ({pending} queued)",
+            "download_skipped": "Skipped {title}: {reason}",
+            "download_expanded": "Queued playlist {title} ({pending} queued)",
             "play_started": "Playing",
             "play_error": "Error: {error}",
             "paused": "Paused",
@@ -759,8 +1421,16 @@ def main():
             "save_failed": "Failed to save playlist: {error}",
             "load_ok": "Playlist loaded: {name} ({count} songs)",
             "load_failed": "Failed to load playlist: {error}",
+            "load_missing": "{count} songs in {name} are missing",
             "volume_changed": "Volume changed: {volume}",
             "song_added": "Added {title} to queue",
+            "scan_progress": "Scanning library... {done}/{total}",
+            "scan_complete": "Library scan complete ({count} new songs)",
+            "scan_cancelled": "Library scan cancelled",
+            "song_removed": "Removed {title} (file deleted)",
+            "update_started": "Downloading update {version}...",
+            "update_installed": "Update {version} downloaded, restart to install",
+            "update_failed": "Update failed: {error}",
         }
 
         now_text = "Now: {index}: {title}"
@@ -771,7 +1441,22 @@ def main():
                 if not msg:
                     continue
                 tag = msg[0]
-                if tag == "play_started":
+                if tag == "download_progress":
+                    _, data = msg
+                    bar = ui.named_widgets.get("download_progress_bar")
+                    if bar:
+                        bar.enabled = data["status"] == "downloading"
+                        bar.progress = data["percent"]
+                    if data["status"] == "downloading":
+                        eta = f", ETA {data['eta']}s" if data["eta"] is not None else ""
+                        ui.named_widgets["status_label"].text = f"Downloading {data['title']}: {data['percent']:.0f}% ({format_bytes(data['speed'])}/s{eta})"
+                    elif data["status"] == "finished":
+                        ui.named_widgets["status_label"].text = f"Converting {data['title']}..."
+                elif tag == "track_analyzed":
+                    # Reload the waveform if the playing track just got one
+                    if msg[1]["path"] == waveform_path:
+                        waveform_path = None
+                elif tag == "play_started":
                     _, data = msg
                     ui.named_widgets["now_playing_label"].text = now_text.format(**data)  
                     ui.named_widgets["status_label"].text = "Playing"
@@ -783,25 +1468,54 @@ def main():
         except queue.Empty:
             pass
 
-        # draw
-        screen.fill((40, 40, 40))
-        ui.draw(screen)
-        ui.named_widgets["playlist"].draw(screen)
+        player.poll_playback()
+        # The visualizer only animates in a visible window, so minimised playback can go idle
+        visualizer = ui.named_widgets.get("visualizer")
+        visualizer_shown = visualizer is not None and scheduler.is_visible()
+        if visualizer_shown:
+            visualizer.update(player)
+        scheduler.animating = player.engine.is_animating() or (visualizer_shown and visualizer.is_active())
 
-        # Draw progress bar
+        # Update progress bar
         if player.playlist and player.index < len(player.playlist):
             entry = player.playlist[player.index]
-            dur = entry.get("duration", 0)
+            dur = entry.duration or 0
             if dur > 0:
                 ui.named_widgets["progress_bar"].enabled = True
-                elapsed = pygame.mixer.music.get_pos() // 1000
-                ratio = min(1.0, elapsed / dur) * 100
-                ui.named_widgets["progress_bar"].progress = ratio
+                if entry.path != waveform_path:
+                    waveform_path = entry.path
+                    ui.named_widgets["progress_bar"].set_waveform(player.get_waveform(waveform_path))
+                # Only move the bar when the displayed second changes
+                elapsed = int(player.position())
+                if (waveform_path, elapsed) != shown_second:
+                    shown_second = (waveform_path, elapsed)
+                    ui.named_widgets["progress_bar"].progress = min(1.0, elapsed / dur) * 100
             else:
                 ui.named_widgets["progress_bar"].enabled = False
-                
-        pygame.display.flip()
-        clock.tick(60)
+
+        if show_frame_stats:
+            stats = f"Frame {scheduler.frame_time:.2f} ms | idle {scheduler.idle_percent:.0f}%"
+            if player.pcm_cache is not None:
+                cache = player.pcm_cache.stats()
+                stats += f" | PCM {cache['hits']}/{cache['hits'] + cache['misses']} hits, {format_bytes(cache['bytes'])}"
+            ui.named_widgets["status_label"].text = stats
+
+        # draw
+        if full_redraw or not retained:
+            screen.fill(BACKGROUND_COLOR)
+            ui.draw(screen)
+            pygame.display.flip()
+            full_redraw = False
+        else:
+            # Retained mode: repaint and push only what changed
+            dirty_rects = ui.draw_dirty(screen, BACKGROUND_COLOR)
+            if dirty_rects:
+                pygame.display.update(dirty_rects)
+        if not startup.finished:
+            startup.mark("first_frame")
+            startup.finish()
+            start_background_work()
+        scheduler.end_frame()
 
     pygame.quit()
     
@@ -1,14 +1,16 @@
-import json
 import os
 from mutagen.mp3 import MP3
+from utils.playlists import PlaylistReader, write_playlist
 
 def update_playlist_durations(path):
     """
-    Load a playlist JSON (new format), compute durations for each track using mutagen,
-    and write the file back with updated duration values.
+    Load a playlist JSON (either layout), compute durations for each track using mutagen,
+    and write the file back with updated duration values. The header's name and journal
+    sequence number are kept.
     """
-    with open(path, "r", encoding="utf-8") as f:
-        playlist = json.load(f)
+    with PlaylistReader(path) as reader:
+        header = reader.header()
+        playlist = list(reader.tracks())
 
     updated = False
     for entry in playlist:
@@ -25,8 +27,7 @@ def update_playlist_durations(path):
             print(f"Could not read {file_path}: {e}")
 
     if updated:
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(playlist, f, indent=2)
+        write_playlist(path, playlist, header.get("name"), header.get("seq", 0))
         print(f"Updated durations written to {path}")
     else:
         print(f"No changes needed for {path}")
@@ -0,0 +1,283 @@
+# downloads.py
+import os
+import re
+import json
+import time
+import heapq
+import itertools
+import threading
+import traceback
+from typing import Any, Callable, Optional
+
+URL_ID_PATTERN = re.compile(r"(?:v=|youtu\.be/|shorts/|embed/|live/)(?P<id>[A-Za-z0-9_-]{11})")
+URL_LIST_PATTERN = re.compile(r"[?&]list=(?P<list>[A-Za-z0-9_-]+)")
+
+def youtube_id_from_url(url: str) -> Optional[str]:
+    """
+    Pulls the video id out of the common YouTube URL shapes without any network access.
+    """
+    match = URL_ID_PATTERN.search(url)
+    return match.group("id") if match else None
+
+
+class ProgressThrottle:
+    """
+    Coalesces yt-dlp progress hook calls into at most ``max_rate`` events per second per job.
+
+    Throttled updates are not dropped: the latest state of each job is held back and sent once
+    the job's interval has passed, so the bar always ends on the newest value. Status changes
+    (finished/error) are passed on at once and replace any held-back update.
+    """
+    def __init__(self, emit: Callable[[dict], None], max_rate: float = 4):
+        self.emit = emit
+        self.interval = 1 / max_rate
+        self.last_emit: dict[Any, float] = {}   # job id -> monotonic time of its last event
+        self.pending: dict[Any, dict] = {}      # job id -> newest held-back event
+        self.lock = threading.Lock()
+
+    def update(self, job: dict, d: dict):
+        now = time.monotonic()
+        status = d.get("status")
+        downloaded = d.get("downloaded_bytes") or 0
+        total = d.get("total_bytes") or d.get("total_bytes_estimate") or 0
+        info = d.get("info_dict") or {}
+        data = {
+            "job": job["id"],
+            "title": info.get("title") or job["url"],
+            "status": status,
+            "downloaded": downloaded,
+            "total": total,
+            "percent": min(100.0, downloaded * 100 / total) if total else 0.0,
+            "speed": d.get("speed") or 0,
+            "eta": d.get("eta")
+        }
+        job_id = job["id"]
+        with self.lock:
+            wait = self.last_emit.get(job_id, 0.0) + self.interval - now
+            if status == "downloading" and wait > 0:
+                # A flush is already scheduled if an update is being held back
+                scheduled = job_id in self.pending
+                self.pending[job_id] = data
+                if not scheduled:
+                    timer = threading.Timer(wait, self._flush, args=(job_id,))
+                    timer.daemon = True
+                    timer.start()
+                return
+            self.pending.pop(job_id, None)
+            if status == "downloading":
+                self.last_emit[job_id] = now
+            else:
+                self.last_emit.pop(job_id, None)
+        self.emit(data)
+
+    def _flush(self, job_id):
+        with self.lock:
+            data = self.pending.pop(job_id, None)
+            if data is None:
+                return
+            self.last_emit[job_id] = time.monotonic()
+        self.emit(data)
+
+    def finish(self, job_id):
+        # Forgets a job; a held-back update is dropped, the job's final status follows it
+        with self.lock:
+            self.pending.pop(job_id, None)
+            self.last_emit.pop(job_id, None)
+
+
+def format_bytes(num: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if num < 1024:
+            return f"{num:.0f}{unit}" if unit == "B" else f"{num:.1f}{unit}"
+        num /= 1024
+    return f"{num:.1f}TB"
+
+
+class DownloadManager:
+    """
+    Bounded download queue.
+
+    A fixed number of worker threads each keep one YoutubeDL instance for their lifetime, so
+    extractor state is reused between jobs and at most ``max_concurrent`` downloads (and ffmpeg
+    postprocesses) run at once. Jobs are ordered by (priority, arrival) and persisted to
+    ``queue_file`` until they finish, so a restart resumes the queue.
+
+    :param ydl_opts: Options shared by every YoutubeDL instance.
+    :param is_downloaded: Returns True for YouTube ids already in the library; those jobs are skipped.
+    :param on_complete: Called with (job, info, file_path) from a worker thread once a file is ready.
+    """
+    def __init__(self, ydl_opts: dict[str, Any], ui_queue, queue_file: str,
+                 is_downloaded: Callable[[str], bool], on_complete: Callable[[dict, dict, str], None],
+                 max_concurrent: int = 2, progress_rate: float = 4):
+        self.ydl_opts = dict(ydl_opts, progress_hooks=[self._progress_hook])
+        self.ui_queue = ui_queue
+        self.queue_file = queue_file
+        self.is_downloaded = is_downloaded
+        self.on_complete = on_complete
+        self.max_concurrent = max(1, max_concurrent)
+        self.heap: list[tuple[int, int, dict]] = []
+        self.active: dict[int, dict] = {}
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+        self.running = False
+        self.local = threading.local()
+        self.progress = ProgressThrottle(lambda data: self.ui_queue.put(("download_progress", data)), progress_rate)
+        self._load_queue()
+
+    # ---- Persistence ----
+    def _load_queue(self):
+        if not os.path.exists(self.queue_file):
+            return
+        try:
+            with open(self.queue_file, "r", encoding="utf-8") as f:
+                jobs = json.load(f)
+        except Exception as e:
+            print(f"Could not read download queue: {e}")
+            return
+        for job in jobs:
+            job["id"] = next(self.counter)
+            heapq.heappush(self.heap, (job.get("priority", 0), job["id"], job))
+
+    def _save_queue(self):
+        # Caller holds self.condition
+        jobs = [job for _, _, job in sorted(self.heap)] + list(self.active.values())
+        tmp_path = self.queue_file + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump([{"url": j["url"], "priority": j["priority"], "youtube_id": j["youtube_id"]} for j in jobs], f)
+            os.replace(tmp_path, self.queue_file)
+        except Exception as e:
+            print(f"Could not save download queue: {e}")
+
+    # ---- Queue ----
+    def pending_count(self) -> int:
+        with self.condition:
+            return len(self.heap) + len(self.active)
+
+    def _is_queued(self, youtube_id: str) -> bool:
+        return any(job["youtube_id"] == youtube_id for _, _, job in self.heap) or \
+            any(job["youtube_id"] == youtube_id for job in self.active.values())
+
+    def enqueue(self, url: str, priority: int = 0) -> bool:
+        """
+        Adds a URL to the queue. Lower priority values run first, ties run in arrival order.
+
+        :return: False if the video is already downloaded or queued.
+        """
+        # Playlist links are expanded by a worker, dedup then happens per entry
+        list_match = URL_LIST_PATTERN.search(url)
+        if list_match:
+            url = f"https://www.youtube.com/playlist?list={list_match.group('list')}"
+        youtube_id = None if list_match else youtube_id_from_url(url)
+        if youtube_id and self.is_downloaded(youtube_id):
+            self.ui_queue.put(("download_skipped", {"title": url, "reason": "already in library"}))
+            return False
+        with self.condition:
+            if youtube_id and self._is_queued(youtube_id):
+                self.ui_queue.put(("download_skipped", {"title": url, "reason": "already queued"}))
+                return False
+            job = {"id": next(self.counter), "url": url, "priority": priority, "youtube_id": youtube_id}
+            heapq.heappush(self.heap, (priority, job["id"], job))
+            self._save_queue()
+            self.condition.notify()
+            pending = len(self.heap) + len(self.active)
+        self.ui_queue.put(("download_queued", {"job": job["id"], "title": url, "pending": pending}))
+        return True
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        for _ in range(self.max_concurrent):
+            threading.Thread(target=self._worker, daemon=True).start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+    def _next_job(self) -> Optional[dict]:
+        with self.condition:
+            while self.running and not self.heap:
+                self.condition.wait()
+            if not self.running:
+                return None
+            _, _, job = heapq.heappop(self.heap)
+            self.active[job["id"]] = job
+            return job
+
+    def _finish_job(self, job: dict):
+        self.progress.finish(job["id"])
+        with self.condition:
+            self.active.pop(job["id"], None)
+            self._save_queue()
+            return len(self.heap) + len(self.active)
+
+    # ---- Workers ----
+    def _worker(self):
+        # Imported here: yt-dlp takes a few hundred ms to import and is only needed once a worker runs
+        import yt_dlp
+        with yt_dlp.YoutubeDL(self.ydl_opts) as ydl: # type: ignore
+            while True:
+                job = self._next_job()
+                if job is None:
+                    return
+                self._run_job(ydl, job)
+
+    def _progress_hook(self, d: dict):
+        # Hooks run on the worker thread that owns the YoutubeDL, so the current job is thread-local
+        job = getattr(self.local, "job", None)
+        if job is not None:
+            self.progress.update(job, d)
+
+    def _run_job(self, ydl, job: dict):
+        self.local.job = job
+        try:
+            self._process_job(ydl, job)
+        finally:
+            self.local.job = None
+
+    def _process_job(self, ydl, job: dict):
+        # Re-check: the same video may have finished in another worker since it was queued
+        if job["youtube_id"] and self.is_downloaded(job["youtube_id"]):
+            pending = self._finish_job(job)
+            self.ui_queue.put(("download_skipped", {"title": job["url"], "reason": "already in library", "pending": pending}))
+            return
+
+        self.ui_queue.put(("download_started", {"job": job["id"], "title": job["url"], "pending": self.pending_count()}))
+        try:
+            if job["youtube_id"] is None:
+                # Playlists and other URLs without a video id are expanded into one job per entry,
+                # so each entry is deduplicated before any download work
+                info = ydl.extract_info(job["url"], download=False, process=False)
+                if info and info.get("_type") in ("playlist", "multi_video"):
+                    for entry in info.get("entries") or []:
+                        entry_url = entry.get("url") or entry.get("webpage_url")
+                        if entry_url:
+                            if entry.get("ie_key") == "Youtube" and not youtube_id_from_url(entry_url):
+                                entry_url = f"https://www.youtube.com/watch?v={entry_url}"
+                            self.enqueue(entry_url, job["priority"])
+                    pending = self._finish_job(job)
+                    self.ui_queue.put(("download_expanded", {"job": job["id"], "title": info.get("title") or job["url"], "pending": pending}))
+                    return
+
+            info = ydl.extract_info(job["url"], download=True)
+            if not info:
+                raise RuntimeError("no-info-extracted")
+            # prepare_filename gives the file name used by outtmpl (before postprocessing ext change)
+            filename = ydl.prepare_filename(info)
+            file_path = None
+            for ext in (".mp3", ".m4a", ".aac"):
+                candidate = os.path.splitext(filename)[0] + ext
+                if os.path.exists(candidate):
+                    file_path = candidate
+                    break
+            if file_path is None:
+                raise RuntimeError("file-not-found-after-download")
+            self.on_complete(job, info, file_path)
+            pending = self._finish_job(job)
+            self.ui_queue.put(("download_complete", {"job": job["id"], "title": info.get("title") or file_path, "pending": pending}))
+        except Exception as e:
+            traceback.print_exc()
+            pending = self._finish_job(job)
+            self.ui_queue.put(("download_failed", {"job": job["id"], "title": job["url"], "error": str(e), "pending": pending}))
@@ -0,0 +1,131 @@
+# library.py
+import os
+import json
+import sqlite3
+import threading
+from typing import Any, Optional
+
+class LibraryIndex:
+    """
+    Persistent song metadata store backed by a single SQLite file.
+
+    Songs are keyed by path, with secondary indexes on youtube_id and title, so
+    lookups are O(1)-ish instead of rescanning every metadata file. The full
+    metadata dict is kept as JSON so extra fields survive round trips.
+    """
+    def __init__(self, db_path: str, legacy_dir: Optional[str] = None):
+        self.db_path = db_path
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS songs ("
+            " path TEXT PRIMARY KEY,"
+            " title TEXT NOT NULL,"
+            " youtube_id TEXT,"
+            " data TEXT NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS songs_youtube_id ON songs (youtube_id)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS songs_title ON songs (title)")
+        self.conn.commit()
+
+        if legacy_dir and self.count() == 0:
+            self.import_legacy_dir(legacy_dir)
+
+    def import_legacy_dir(self, legacy_dir: str):
+        """
+        One-time import of the old one-JSON-per-song metadata folder.
+
+        :param legacy_dir: Folder holding the per-song ``<title>.json`` files.
+        :return: Number of songs imported.
+        """
+        entries = []
+        for metadata_file in os.listdir(legacy_dir):
+            if not metadata_file.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(legacy_dir, metadata_file), "r", encoding="utf-8") as f:
+                    metadata = json.load(f)
+            except Exception as e:
+                print(f"Could not import {metadata_file}: {e}")
+                continue
+            if "path" in metadata and "title" in metadata:
+                entries.append(metadata)
+        self.put_many(entries)
+        return len(entries)
+
+    def _row_to_metadata(self, row) -> Optional[dict[str, Any]]:
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def count(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM songs").fetchone()[0]
+
+    def put(self, metadata: dict[str, Any]):
+        self.put_many([metadata])
+
+    def put_many(self, entries: list[dict[str, Any]]):
+        rows = [(m["path"], m["title"], m.get("youtube_id"), json.dumps(m)) for m in entries]
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO songs (path, title, youtube_id, data) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self.conn.commit()
+
+    def update(self, path: str, **fields):
+        """
+        Merges extra fields into the stored metadata for a path.
+
+        :return: The updated metadata, or None if the path is not indexed.
+        """
+        with self.lock:
+            metadata = self.get_by_path(path)
+            if metadata is None:
+                return None
+            metadata.update(fields)
+            self.put(metadata)
+            return metadata
+
+    def remove(self, path: str):
+        with self.lock:
+            self.conn.execute("DELETE FROM songs WHERE path = ?", (path,))
+            self.conn.commit()
+
+    def get_by_path(self, path: str) -> Optional[dict[str, Any]]:
+        with self.lock:
+            row = self.conn.execute("SELECT data FROM songs WHERE path = ?", (path,)).fetchone()
+        return self._row_to_metadata(row)
+
+    def get_by_youtube_id(self, youtube_id: str) -> Optional[dict[str, Any]]:
+        with self.lock:
+            row = self.conn.execute("SELECT data FROM songs WHERE youtube_id = ?", (youtube_id,)).fetchone()
+        return self._row_to_metadata(row)
+
+    def get_by_title(self, title: str) -> Optional[dict[str, Any]]:
+        with self.lock:
+            row = self.conn.execute("SELECT data FROM songs WHERE title = ?", (title,)).fetchone()
+        return self._row_to_metadata(row)
+
+    def has_path(self, path: str) -> bool:
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM songs WHERE path = ?", (path,)).fetchone() is not None
+
+    def paths(self) -> set[str]:
+        with self.lock:
+            return {row[0] for row in self.conn.execute("SELECT path FROM songs")}
+
+    def all(self) -> dict[str, dict[str, Any]]:
+        """
+        Returns every indexed song keyed by title.
+        """
+        with self.lock:
+            rows = self.conn.execute("SELECT title, data FROM songs ORDER BY title").fetchall()
+        return {title: json.loads(data) for title, data in rows}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,281 @@
+# loudness.py
+import os
+import sys
+import base64
+import shutil
+import threading
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Iterable, Optional
+import numpy as np
+
+SAMPLE_RATE = 48000
+CHANNELS = 2
+SEGMENT = SAMPLE_RATE // 10        # 100 ms; a 400 ms gating block is 4 segments (75% overlap)
+CHUNK_SEGMENTS = 256               # segments decoded and transformed per step
+TARGET_LUFS = -18.0                # ReplayGain 2.0 reference level
+WAVEFORM_BLOCK = SEGMENT // 10     # 10 ms of samples per raw waveform peak
+WAVEFORM_BINS = 1024               # stored peaks per track at most
+SPECTRUM_RATE = 20                 # spectrogram frames per second
+SPECTRUM_HOP = SAMPLE_RATE // SPECTRUM_RATE
+SPECTRUM_FFT = 4096                # about 85 ms, close to the visualizer's live window
+SPECTRUM_BANDS = 64
+SPECTRUM_FLOOR_DB = -60.0
+# Log-spaced band edges in Hz; the visualizer maps its bars onto these
+SPECTRUM_EDGES = np.geomspace(40.0, 5512.5, SPECTRUM_BANDS + 1)
+
+# ITU-R BS.1770 K-weighting at 48 kHz: high shelf followed by a high-pass (RLB) filter
+_SHELF = ([1.53512485958697, -2.69169618940638, 1.19839281085285], [1.0, -1.69065929318241, 0.73248077421585])
+_HIGHPASS = ([1.0, -2.0, 1.0], [1.0, -1.99004745483398, 0.99007225036621])
+
+def _biquad_power(coefficients, frequencies: np.ndarray) -> np.ndarray:
+    b, a = coefficients
+    z = np.exp(-2j * np.pi * frequencies / SAMPLE_RATE)
+    response = (b[0] + b[1] * z + b[2] * z * z) / (a[0] + a[1] * z + a[2] * z * z)
+    return np.abs(response) ** 2
+
+def _segment_weights() -> np.ndarray:
+    """
+    Per-bin weights that turn an rfft power spectrum of one segment into its K-weighted mean square.
+    """
+    frequencies = np.fft.rfftfreq(SEGMENT, 1 / SAMPLE_RATE)
+    weights = _biquad_power(_SHELF, frequencies) * _biquad_power(_HIGHPASS, frequencies)
+    # Parseval for a real FFT: every bin but DC and Nyquist stands for two
+    weights[1:-1] *= 2
+    return (weights / SEGMENT ** 2).astype(np.float32)
+
+_WEIGHTS = _segment_weights()
+
+def ffmpeg_available() -> bool:
+    return shutil.which("ffmpeg") is not None
+
+def _lower_priority():
+    # Runs once in each worker process; ffmpeg children inherit the niceness
+    if sys.platform == "win32":
+        # os.nice does not exist there; the NumPy work in the worker itself should yield as well
+        import ctypes
+        from ctypes import wintypes
+        kernel32 = ctypes.windll.kernel32 # type: ignore
+        kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+        kernel32.SetPriorityClass.argtypes = (wintypes.HANDLE, wintypes.DWORD)
+        if not kernel32.SetPriorityClass(kernel32.GetCurrentProcess(), subprocess.BELOW_NORMAL_PRIORITY_CLASS): # type: ignore
+            print("Could not lower the analysis worker's priority")
+    elif hasattr(os, "nice"):
+        try:
+            os.nice(10)
+        except OSError:
+            pass
+
+def segment_powers(samples: np.ndarray) -> np.ndarray:
+    """
+    K-weighted mean square of each 100 ms segment, summed over channels.
+
+    :param samples: float32 array of shape (segments * SEGMENT, CHANNELS).
+    """
+    segments = samples.reshape(-1, SEGMENT, samples.shape[1])
+    spectrum = np.fft.rfft(segments, axis=1)
+    power = spectrum.real ** 2 + spectrum.imag ** 2
+    return np.einsum("sfc,f->s", power, _WEIGHTS)
+
+def block_peaks(samples: np.ndarray) -> np.ndarray:
+    """
+    Absolute peak of every WAVEFORM_BLOCK frames across all channels.
+    """
+    return np.abs(samples.reshape(-1, WAVEFORM_BLOCK * samples.shape[1])).max(axis=1)
+
+def waveform(peaks: np.ndarray, bins: int = WAVEFORM_BINS) -> np.ndarray:
+    """
+    Reduces raw block peaks to at most ``bins`` uint8 peaks (0..255 full scale).
+    """
+    if not len(peaks):
+        return np.zeros(0, dtype=np.uint8)
+    bins = min(bins, len(peaks))
+    edges = np.linspace(0, len(peaks), bins, endpoint=False).astype(np.intp)
+    reduced = np.maximum.reduceat(peaks, edges)
+    return np.round(np.clip(reduced, 0, 1) * 255).astype(np.uint8)
+
+def encode_waveform(peaks: np.ndarray) -> str:
+    # About 1.4 KB of base64 per track, small enough to live in the metadata JSON
+    return base64.b64encode(peaks.tobytes()).decode("ascii")
+
+def decode_waveform(text: Optional[str]) -> Optional[bytes]:
+    if not text:
+        return None
+    try:
+        return base64.b64decode(text)
+    except ValueError:
+        return None
+
+_SPECTRUM_WINDOW = np.hanning(SPECTRUM_FFT).astype(np.float32)
+_SPECTRUM_BINS = np.searchsorted(np.fft.rfftfreq(SPECTRUM_FFT, 1 / SAMPLE_RATE), SPECTRUM_EDGES[:-1])
+
+def spectrogram_frames(mono: np.ndarray, first_end: int, count: int) -> np.ndarray:
+    """
+    Band levels (uint8, 0..255 over SPECTRUM_FLOOR_DB..0 dBFS) for ``count`` windows of ``mono``,
+    the first ending at index ``first_end`` and each following one SPECTRUM_HOP later.
+    """
+    windows = np.lib.stride_tricks.sliding_window_view(mono, SPECTRUM_FFT)
+    starts = first_end - SPECTRUM_FFT + np.arange(count) * SPECTRUM_HOP
+    magnitude = np.abs(np.fft.rfft(windows[starts] * _SPECTRUM_WINDOW, axis=1))
+    # Loudest bin per band; a band narrower than one bin takes the bin it starts in
+    bands = np.maximum.reduceat(magnitude, _SPECTRUM_BINS, axis=1)
+    levels = 20 * np.log10(np.maximum(bands, 1e-9) / (SPECTRUM_FFT / 4)) / -SPECTRUM_FLOOR_DB + 1
+    return np.round(np.clip(levels, 0, 1) * 255).astype(np.uint8)
+
+def integrated_loudness(powers: np.ndarray) -> Optional[float]:
+    """
+    Gated integrated loudness in LUFS from per-segment powers, or None if the track is silent or too short.
+    """
+    if len(powers) < 4:
+        return None
+    blocks = np.convolve(powers, np.full(4, 0.25), mode="valid")
+    blocks = blocks[blocks > 10 ** ((-70 + 0.691) / 10)]     # absolute gate, -70 LUFS
+    if not len(blocks):
+        return None
+    relative_gate = np.mean(blocks) * 0.1                      # -10 LU below the ungated level
+    blocks = blocks[blocks > relative_gate]
+    return float(-0.691 + 10 * np.log10(np.mean(blocks)))
+
+def analyze_file(path: str) -> dict[str, Any]:
+    """
+    Decodes a file through ffmpeg and measures it chunk by chunk, so memory stays bounded by
+    CHUNK_SEGMENTS regardless of the track length. Kept free of player state for worker processes.
+
+    The same decode also yields the spectrogram the visualizer plays back, so a track is only
+    ever decoded for analysis once.
+
+    :return: {"path", "loudness", "peak", "replaygain_db", "waveform", "spectrogram"}; loudness is
+        None if it could not be measured, waveform is the encode_waveform() text and spectrogram
+        a (frames, SPECTRUM_BANDS) uint8 array at SPECTRUM_RATE frames per second.
+    """
+    command = ["ffmpeg", "-nostdin", "-v", "error", "-i", path, "-map", "0:a:0",
+               "-f", "f32le", "-ac", str(CHANNELS), "-ar", str(SAMPLE_RATE), "pipe:1"]
+    creationflags = getattr(subprocess, "BELOW_NORMAL_PRIORITY_CLASS", 0) if sys.platform == "win32" else 0
+    chunk_bytes = CHUNK_SEGMENTS * SEGMENT * CHANNELS * 4
+    powers = []
+    peaks = []
+    frames = []
+    peak = 0.0
+    leftover = b""
+    # Mono history for the spectrogram; starts with one window of silence before the track
+    history = np.zeros(SPECTRUM_FFT, dtype=np.float32)
+    history_start = -SPECTRUM_FFT     # sample index of history[0]
+    next_frame = 0                    # sample index the next spectrogram window ends at
+    with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, creationflags=creationflags) as process:
+        while True:
+            data = process.stdout.read(chunk_bytes) # type: ignore
+            if not data:
+                break
+            data = leftover + data
+            usable = len(data) - len(data) % (SEGMENT * CHANNELS * 4)
+            leftover = data[usable:]
+            if not usable:
+                continue
+            samples = np.frombuffer(data[:usable], dtype=np.float32).reshape(-1, CHANNELS)
+            chunk_peaks = block_peaks(samples)
+            peak = max(peak, float(chunk_peaks.max()))
+            peaks.append(chunk_peaks)
+            powers.append(segment_powers(samples))
+
+            history = np.concatenate((history, samples.mean(axis=1)))
+            history_end = history_start + len(history)
+            count = (history_end - next_frame) // SPECTRUM_HOP + 1 if next_frame <= history_end else 0
+            if count:
+                frames.append(spectrogram_frames(history, next_frame - history_start, count))
+                next_frame += count * SPECTRUM_HOP
+            # Keep only what the next window still needs
+            keep = history_end - (next_frame - SPECTRUM_FFT)
+            history = history[len(history) - keep:]
+            history_start = history_end - keep
+        if process.wait() != 0 and not powers:
+            raise RuntimeError(f"ffmpeg exited with code {process.returncode}")
+    if leftover:
+        tail = np.frombuffer(leftover[:len(leftover) - len(leftover) % (CHANNELS * 4)], dtype=np.float32)
+        if len(tail):
+            peak = max(peak, float(np.abs(tail).max()))
+
+    loudness = integrated_loudness(np.concatenate(powers)) if powers else None
+    gain = None
+    if loudness is not None:
+        gain = TARGET_LUFS - loudness
+        if peak > 0:
+            # Never push the sample peak past full scale
+            gain = min(gain, -20 * float(np.log10(peak)))
+        gain = round(gain, 2)
+    return {
+        "path": path,
+        "loudness": None if loudness is None else round(loudness, 2),
+        "peak": round(peak, 4),
+        "replaygain_db": gain,
+        "waveform": encode_waveform(waveform(np.concatenate(peaks))) if peaks else None,
+        "spectrogram": np.concatenate(frames) if frames else None
+    }
+
+
+class LoudnessAnalyzer:
+    """
+    Measures loudness and waveform peaks in a low-priority process pool, one track per task.
+
+    Results are handed to ``on_result`` as soon as each track is done, so the caller can persist
+    them one by one; skipping tracks that already have a result makes the work incremental and
+    resumable across restarts.
+
+    :param on_result: Called with the analyze_file result dict, or with {"path", "error"} on failure.
+    :param workers: Worker processes. Defaults to one, analysis is background work.
+    """
+    def __init__(self, on_result: Callable[[dict], None], workers: int = 1):
+        self.on_result = on_result
+        self.workers = max(1, workers)
+        self.lock = threading.Lock()
+        self.queue: list[str] = []
+        self.queued: set[str] = set()
+        self.running = False
+        self.stopped = threading.Event()
+
+    def analyze(self, paths: Iterable[str]):
+        """
+        Queues paths for analysis and starts the background run if needed. Already queued paths are ignored.
+        """
+        with self.lock:
+            for path in paths:
+                if path not in self.queued:
+                    self.queued.add(path)
+                    self.queue.append(path)
+            if self.running or not self.queue or self.stopped.is_set():
+                return
+            self.running = True
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def _take(self, count: int) -> list[str]:
+        with self.lock:
+            paths, self.queue = self.queue[:count], self.queue[count:]
+            if not paths:
+                self.running = False
+            return paths
+
+    def _run(self):
+        executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_lower_priority)
+        try:
+            while not self.stopped.is_set():
+                paths = self._take(self.workers * 4)
+                if not paths:
+                    return
+                futures = {executor.submit(analyze_file, path): path for path in paths}
+                for future in as_completed(futures):
+                    if self.stopped.is_set():
+                        return
+                    path = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = {"path": path, "error": str(e)}
+                    with self.lock:
+                        self.queued.discard(path)
+                    self.on_result(result)
+        finally:
+            with self.lock:
+                self.running = False
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,174 @@
+# pcm_cache.py
+import os
+import json
+import mmap
+import time
+import hashlib
+import threading
+from typing import Optional
+import pygame
+
+class PCMCache:
+    """
+    Bounded on-disk cache of decoded audio for frequently played tracks.
+
+    Tracks are decoded once into the mixer's raw sample format and stored as flat files that are
+    memory-mapped at play time, so a hot track starts without decoding. Entries are keyed by path,
+    mtime and mixer format, and evicted least-recently-used once the total size exceeds max_bytes.
+    Only tracks played at least ``min_plays`` times are decoded.
+
+    The index is written at most once per ``save_delay`` seconds from a timer thread, so counting
+    a play never touches the disk on the caller's thread.
+    """
+    def __init__(self, cache_dir: str, max_bytes: int = 1024 * 1024 * 1024, min_plays: int = 2, save_delay: float = 5.0):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.min_plays = min_plays
+        self.index_file = os.path.join(cache_dir, "index.json")
+        self.lock = threading.Lock()
+        self.decoding: set[str] = set()
+        self.save_delay = save_delay
+        self.save_timer: Optional[threading.Timer] = None
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self.entries: dict[str, dict] = {}   # key -> {"path", "size", "last_used"}
+        self.plays: dict[str, int] = {}      # path -> play count
+        self._load_index()
+
+    # ---- Index ----
+    def _load_index(self):
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.plays = data.get("plays", {})
+        for key, entry in data.get("entries", {}).items():
+            if os.path.exists(self._file(key)):
+                self.entries[key] = entry
+
+    def _schedule_save(self):
+        # Caller holds self.lock; changes made before the timer fires are written together
+        if self.save_timer is None:
+            self.save_timer = threading.Timer(self.save_delay, self.flush)
+            self.save_timer.daemon = True
+            self.save_timer.start()
+
+    def flush(self):
+        """
+        Writes the index now if anything changed since the last write.
+        """
+        with self.lock:
+            if self.save_timer is None:
+                return
+            self.save_timer.cancel()
+            self.save_timer = None
+            data = json.dumps({"entries": self.entries, "plays": self.plays})
+        tmp_path = self.index_file + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, self.index_file)
+        except OSError as e:
+            print(f"Could not save the PCM cache index: {e}")
+
+    def _key(self, path: str) -> Optional[str]:
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        mixer_format = pygame.mixer.get_init()
+        return hashlib.sha1(f"{os.path.abspath(path)}|{mtime}|{mixer_format}".encode("utf-8")).hexdigest()
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.pcm")
+
+    def total_bytes(self) -> int:
+        return sum(entry["size"] for entry in self.entries.values())
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries), "bytes": self.total_bytes()}
+
+    # ---- Lookup ----
+    def count(self, hit: bool):
+        # Hits and misses describe plays; lookups for preloading or the visualizer pass count=False
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, path: str, count: bool = True) -> Optional[mmap.mmap]:
+        """
+        Returns the decoded samples for path as a read-only memory map, or None on a miss.
+
+        :param count: Count the lookup as a play's hit or miss in stats().
+        """
+        key = self._key(path)
+        with self.lock:
+            if key is None or key not in self.entries:
+                if count:
+                    self.misses += 1
+                return None
+            if count:
+                self.hits += 1
+            self.entries[key]["last_used"] = time.time()
+        try:
+            with open(self._file(key), "rb") as f:
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            with self.lock:
+                self.entries.pop(key, None)
+            return None
+
+    # ---- Filling ----
+    def record_play(self, path: str):
+        """
+        Counts a play and decodes the track in the background once it is played often enough.
+        """
+        key = self._key(path)
+        with self.lock:
+            self.plays[path] = self.plays.get(path, 0) + 1
+            wanted = key is not None and key not in self.entries and path not in self.decoding \
+                and self.plays[path] >= self.min_plays
+            if wanted:
+                self.decoding.add(path)
+            self._schedule_save()
+        if wanted:
+            threading.Thread(target=self._decode, args=(path, key), daemon=True).start()
+
+    def _decode(self, path: str, key: str):
+        tmp_path = self._file(key) + ".tmp"
+        try:
+            raw = pygame.mixer.Sound(path).get_raw()
+            if len(raw) > self.max_bytes:
+                return
+            with open(tmp_path, "wb") as f:
+                f.write(raw)
+            os.replace(tmp_path, self._file(key))
+            with self.lock:
+                self.entries[key] = {"path": path, "size": len(raw), "last_used": time.time()}
+                self._evict()
+                self._schedule_save()
+        except Exception as e:
+            print(f"Could not cache {path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        finally:
+            with self.lock:
+                self.decoding.discard(path)
+
+    def _evict(self):
+        # Caller holds self.lock
+        total = self.total_bytes()
+        for key, entry in sorted(self.entries.items(), key=lambda item: item[1]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self._file(key))
+            except OSError:
+                pass
+            total -= entry["size"]
+            del self.entries[key]
@@ -0,0 +1,448 @@
+# playback.py
+import io
+import os
+import mmap
+import time
+import threading
+import collections
+from typing import Callable, Optional
+import pygame
+from utils.pcm_cache import PCMCache
+
+class PCMStream:
+    """
+    Cursor over a memory-mapped, decoded track that hands it out as short Sounds.
+
+    Only the chunk about to be queued is copied out of the map, so starting or seeking a cached
+    track costs one chunk rather than a copy of the whole track.
+    """
+    def __init__(self, path: str, mapped: mmap.mmap, mixer_format: tuple[int, int, int], chunk_seconds: float = 2.0):
+        frequency, size, channels = mixer_format
+        self.path = path
+        self.mapped = mapped
+        self.frequency = frequency
+        self.frame_bytes = abs(size) // 8 * channels
+        self.chunk_bytes = max(1, int(chunk_seconds * frequency)) * self.frame_bytes
+        self.offset = 0
+
+    @property
+    def done(self) -> bool:
+        return self.offset >= len(self.mapped)
+
+    def seek(self, position: float):
+        self.offset = min(len(self.mapped), int(position * self.frequency) * self.frame_bytes)
+
+    def next_chunk(self) -> Optional[pygame.mixer.Sound]:
+        if self.done:
+            return None
+        end = min(len(self.mapped), self.offset + self.chunk_bytes)
+        chunk = pygame.mixer.Sound(buffer=self.mapped[self.offset:end])
+        self.offset = end
+        return chunk
+
+    def close(self):
+        self.mapped.close()
+
+class PlaybackClock:
+    """
+    Position of the playing track, kept from time.monotonic() rather than polled from the mixer.
+
+    Holds the monotonic time the track would have started at; pausing records the pause time and
+    resuming shifts the start by the paused interval, seeking moves the start, so position() is a
+    single subtraction and never drifts across pause, seek and resume.
+    """
+    def __init__(self):
+        self.started: Optional[float] = None
+        self.paused_at: Optional[float] = None
+
+    @property
+    def paused(self) -> bool:
+        return self.paused_at is not None
+
+    def start(self, position: float = 0.0):
+        self.started = time.monotonic() - position
+        self.paused_at = None
+
+    def stop(self):
+        self.started = None
+        self.paused_at = None
+
+    def pause(self):
+        if self.started is not None and self.paused_at is None:
+            self.paused_at = time.monotonic()
+
+    def resume(self):
+        if self.paused_at is not None and self.started is not None:
+            self.started += time.monotonic() - self.paused_at
+        self.paused_at = None
+
+    def seek(self, position: float):
+        if self.started is not None:
+            self.started = (self.paused_at if self.paused_at is not None else time.monotonic()) - position
+
+    def position(self) -> float:
+        """
+        Seconds into the current track, 0 when stopped.
+        """
+        if self.started is None:
+            return 0.0
+        return (self.paused_at if self.paused_at is not None else time.monotonic()) - self.started
+
+
+class PlaybackEngine:
+    """
+    Wraps pygame.mixer.music with next-track preloading.
+
+    The next track is read into memory on a background thread and handed to
+    pygame.mixer.music.queue, so SDL_mixer starts it from its own audio callback the moment the
+    current one ends, without waiting for the main loop or the disk.
+
+    With ``crossfade`` > 0 the outgoing track fades out over its last ``crossfade`` seconds and
+    the queued one fades in. SDL_mixer only plays one music stream at a time, so the two fades
+    follow each other rather than overlap.
+
+    Tracks found in ``pcm_cache`` skip decoding: their memory-mapped samples are fed to a
+    reserved Channel a couple of seconds at a time, one chunk playing and one queued behind it.
+    Each finished chunk posts ``chunk_event``, which the main loop hands to on_chunk_end() to
+    queue the next one; when the last chunk of a track finishes ``end_event`` is posted, so both
+    backends end tracks the same way. A cached track following a cached track continues on the
+    channel without a gap.
+
+    :param on_preloaded: Called from the loader thread once a track is ready to be queued, so an
+        idle main loop can be woken to call poll().
+    :param end_event: Event type posted when a track ends, shared by both backends.
+    :param chunk_event: Event type the channel posts after every chunk; required with ``pcm_cache``.
+    :param clock: Clock to keep in step with playback; a private one is created if omitted.
+    """
+    def __init__(self, crossfade: float = 0.0, preload_limit: int = 64 * 1024 * 1024,
+                 on_preloaded: Optional[Callable[[str], None]] = None, pcm_cache: Optional[PCMCache] = None,
+                 end_event: Optional[int] = None, chunk_event: Optional[int] = None,
+                 clock: Optional[PlaybackClock] = None):
+        self.pcm_cache = pcm_cache
+        self.channel = None
+        self.stream: Optional[PCMStream] = None       # cached track playing on self.channel
+        self.next_stream: Optional[PCMStream] = None  # cached track to continue with once it runs out
+        self.chunks = collections.deque()             # (stream, is last chunk) for the playing and queued chunk
+        self.backend = "music"
+        self.clock = clock or PlaybackClock()
+        self.end_event = end_event
+        self.chunk_event = chunk_event
+        if pcm_cache is not None:
+            pygame.mixer.set_reserved(1)
+            self.channel = pygame.mixer.Channel(0)
+            if chunk_event is not None:
+                self.channel.set_endevent(chunk_event)
+        self.crossfade = crossfade
+        self.preload_limit = preload_limit
+        self.on_preloaded = on_preloaded
+        self.volume = 1.0
+        self.gain = 1.0               # per-track loudness correction, multiplied into the volume
+        self.current = None           # path of the playing track
+        self.duration = None          # seconds, if known
+        self.queued = None            # path handed to mixer.music.queue
+        self.wanted = None            # path that should be queued next
+        self.preloaded = None         # (path, bytes or PCM cache map) ready to be queued
+        self.lock = threading.Lock()
+        self.fading_out = False
+        self.fade_in_start = None
+
+    # ---- Transport ----
+    def play(self, path: str, duration: Optional[float] = None, fade_ms: int = 0, gain: float = 1.0):
+        self.gain = gain
+        stream = self._open_stream(path)
+        self._halt_channel()
+        self._close_streams()
+        if stream is not None:
+            pygame.mixer.music.unload()
+            self.backend = "channel"
+            self.stream = stream
+            self._set_output_volume(self.volume * self.gain)
+            self._start_stream(fade_ms)
+        else:
+            pygame.mixer.music.load(path)
+            pygame.mixer.music.set_volume(self.volume * self.gain)
+            pygame.mixer.music.play(fade_ms=fade_ms)
+            self.backend = "music"
+        self.clock.start()
+        if self.pcm_cache is not None:
+            self.pcm_cache.record_play(path)
+        self.current = path
+        self.duration = duration
+        self.queued = None
+        self.fading_out = False
+        self.fade_in_start = None
+
+    def _open_stream(self, path: str) -> Optional[PCMStream]:
+        # The preloaded map if there is one, else a direct lookup; this counts as the play's cache hit or miss
+        if self.pcm_cache is None or self.chunk_event is None:
+            return None
+        mapped = None
+        with self.lock:
+            if self.preloaded and self.preloaded[0] == path and isinstance(self.preloaded[1], mmap.mmap):
+                mapped = self.preloaded[1]
+                self.preloaded = None
+        mixer_format = pygame.mixer.get_init()
+        if not mixer_format:
+            return None
+        if mapped is None:
+            mapped = self.pcm_cache.get(path)
+        else:
+            self.pcm_cache.count(hit=True)
+        if mapped is None:
+            return None
+        if not len(mapped):
+            mapped.close()
+            return None
+        return PCMStream(path, mapped, mixer_format)
+
+    def _start_stream(self, fade_ms: int = 0):
+        # Plays self.stream from its offset with the next chunk queued behind
+        self.chunks.clear()
+        chunk = self.stream.next_chunk() # type: ignore
+        if chunk is None:
+            return
+        self.chunks.append((self.stream, self.stream.done)) # type: ignore
+        self.channel.play(chunk, fade_ms=fade_ms) # type: ignore
+        self._feed()
+
+    def _feed(self):
+        # Keeps one chunk queued behind the playing one, moving on to the next track when this one runs out
+        if self.stream is None or len(self.chunks) >= 2:
+            return
+        stream = self.chunks[-1][0] if self.chunks else self.stream
+        if stream.done:
+            stream = self.next_stream if stream is self.stream else None
+        if stream is None or stream.done:
+            return
+        chunk = stream.next_chunk()
+        if chunk is None:
+            return
+        self.chunks.append((stream, stream.done))
+        self.channel.queue(chunk) # type: ignore
+
+    def on_chunk_end(self):
+        """
+        Call when the chunk event arrives. Queues the next chunk, and posts the end event once the
+        last chunk of a track has finished.
+        """
+        if not self.chunks:
+            return
+        _, last = self.chunks.popleft()
+        if last and self.end_event is not None:
+            pygame.event.post(pygame.event.Event(self.end_event))
+        self._feed()
+
+    def _close_streams(self):
+        for stream in (self.stream, self.next_stream):
+            if stream is not None:
+                stream.close()
+        self.stream = None
+        self.next_stream = None
+        self.chunks.clear()
+
+    def position(self) -> float:
+        """
+        Seconds into the current track.
+        """
+        return self.clock.position()
+
+    def seek(self, position: float):
+        """
+        Jumps to position (seconds) in the current track.
+        """
+        if self.current is None:
+            return
+        position = max(0.0, position)
+        if self.duration:
+            position = min(position, self.duration)
+        if self.backend == "channel":
+            if self.stream is None:
+                return
+            self._halt_channel()
+            if self.next_stream is not None:
+                self.next_stream.offset = 0
+            self.stream.seek(position)
+            self._start_stream()
+            if self.clock.paused:
+                self.channel.pause() # type: ignore
+        else:
+            # MP3 positions are only absolute after a rewind
+            pygame.mixer.music.rewind()
+            pygame.mixer.music.set_pos(position)
+        self.clock.seek(position)
+        # Seeking out of a fade-out restores the volume
+        self.fading_out = False
+        if self.fade_in_start is None:
+            self._set_output_volume(self.volume * self.gain)
+
+    def pause(self):
+        if self.backend == "channel":
+            self.channel.pause() # type: ignore
+        else:
+            pygame.mixer.music.pause()
+        self.clock.pause()
+
+    def resume(self):
+        if self.backend == "channel":
+            self.channel.unpause() # type: ignore
+        else:
+            pygame.mixer.music.unpause()
+        self.clock.resume()
+
+    def stop(self):
+        # unload() frees the current and the queued track without firing the end event,
+        # stop() would fire it and start the queued track
+        pygame.mixer.music.unload()
+        self._halt_channel()
+        self._close_streams()
+        self.clock.stop()
+        self.current = None
+        self.queued = None
+
+    def _halt_channel(self):
+        # Halting a channel posts its chunk event, which would be taken for a finished chunk
+        self.chunks.clear()
+        if self.channel is None or not self.channel.get_busy():
+            return
+        self.channel.set_endevent()
+        self.channel.stop()
+        if self.chunk_event is not None:
+            self.channel.set_endevent(self.chunk_event)
+
+    def _set_output_volume(self, volume: float):
+        # Channel volume applies to every chunk, queued ones included
+        if self.backend == "channel":
+            self.channel.set_volume(volume) # type: ignore
+        else:
+            pygame.mixer.music.set_volume(volume)
+
+    def set_volume(self, volume: float):
+        self.volume = volume
+        if self.fade_in_start is None:
+            self._set_output_volume(volume * self.gain)
+
+    def set_gain(self, gain: float):
+        self.gain = gain
+        if self.fade_in_start is None:
+            self._set_output_volume(self.volume * gain)
+
+    # ---- Preloading ----
+    def prepare_next(self, path: Optional[str]):
+        """
+        Makes path the track that plays after the current one. Reading happens in the background.
+        """
+        with self.lock:
+            if path == self.wanted:
+                return
+            self.wanted = path
+            if path is None or (self.preloaded and self.preloaded[0] == path):
+                return
+        threading.Thread(target=self._load, args=(path,), daemon=True).start()
+
+    def _load(self, path: str):
+        try:
+            # Preloading is not a play, so it does not count towards the cache hit rate
+            mapped = self.pcm_cache.get(path, count=False) if self.pcm_cache is not None and self.chunk_event is not None else None
+            if mapped is not None:
+                data = mapped
+            elif os.path.getsize(path) <= self.preload_limit:
+                with open(path, "rb") as f:
+                    data = f.read()
+            else:
+                data = None  # too big to hold, queue by path instead
+        except OSError as e:
+            print(f"Could not preload {path}: {e}")
+            return
+        with self.lock:
+            if path != self.wanted:
+                return
+            self.preloaded = (path, data)
+        if self.on_preloaded:
+            self.on_preloaded(path)
+
+    def poll(self):
+        """
+        Call from the main loop. Queues a preloaded track and drives crossfades.
+        """
+        with self.lock:
+            ready = self.preloaded if self.preloaded and self.preloaded[0] == self.wanted else None
+        if ready and self.current and self.queued != ready[0]:
+            path, data = ready
+            if isinstance(data, mmap.mmap):
+                # Cached tracks can only follow a cached track without a gap
+                started = any(stream is self.next_stream for stream, _ in self.chunks)
+                if self.backend == "channel" and self.stream is not None and not started and pygame.mixer.get_init():
+                    if self.next_stream is not None:
+                        self.next_stream.close()
+                    self.next_stream = PCMStream(path, data, pygame.mixer.get_init()) # type: ignore
+                    with self.lock:
+                        self.preloaded = None
+                    self.queued = path
+                    self._feed()
+            elif self.backend == "music":
+                source = io.BytesIO(data) if data is not None else path
+                pygame.mixer.music.queue(source, namehint=os.path.splitext(path)[1].lstrip("."))
+                self.queued = path
+
+        if self.crossfade > 0 and self.current and self.duration and self._busy():
+            position = self.position()
+            if not self.fading_out and position >= self.duration - self.crossfade:
+                self.fading_out = True
+                if self.backend == "music":
+                    pygame.mixer.music.fadeout(int(self.crossfade * 1000))
+            elif self.fading_out and self.backend == "channel" and position < self.duration - 0.1 * self.crossfade:
+                # Channel.fadeout() would halt the channel and drop the queued chunks, so ramp by hand
+                self._set_output_volume(self.volume * self.gain * max(0.0, (self.duration - position) / self.crossfade))
+            elif self.fading_out and position >= self.duration - 0.1 * self.crossfade:
+                # Nearly silent already; mute so the queued track, which SDL_mixer starts at the
+                # current volume, begins silent and is faded in by on_track_end
+                self._set_output_volume(0)
+
+        if self.fade_in_start is not None:
+            progress = (time.monotonic() - self.fade_in_start) / self.crossfade
+            if progress >= 1:
+                self.fade_in_start = None
+                self._set_output_volume(self.volume * self.gain)
+            else:
+                self._set_output_volume(self.volume * self.gain * progress)
+
+    def _busy(self) -> bool:
+        if self.backend == "channel":
+            return self.channel.get_busy() # type: ignore
+        return pygame.mixer.music.get_busy()
+
+    def is_animating(self) -> bool:
+        # A running fade wants frequent polls
+        return self.fading_out or self.fade_in_start is not None
+
+    def on_track_end(self, duration: Optional[float] = None, gain: float = 1.0) -> Optional[str]:
+        """
+        Call when the end event arrives.
+
+        :return: The path SDL_mixer already switched to, or None if nothing was queued.
+        """
+        if self.queued is None:
+            self.current = None
+            self.clock.stop()
+            return None
+        self.current = self.queued
+        self.duration = duration
+        self.gain = gain
+        self.queued = None
+        self.fading_out = False
+        if self.backend == "channel" and self.next_stream is not None:
+            self.stream.close() # type: ignore
+            self.stream, self.next_stream = self.next_stream, None
+        with self.lock:
+            if self.preloaded and self.preloaded[0] == self.current:
+                self.preloaded = None
+            self.wanted = None
+        self.clock.start()
+        if self.pcm_cache is not None:
+            self.pcm_cache.record_play(self.current)
+        if self.crossfade > 0:
+            self._set_output_volume(0)
+            self.fade_in_start = time.monotonic()
+        else:
+            self._set_output_volume(self.volume * self.gain)
+        return self.current
@@ -0,0 +1,357 @@
+# playlists.py
+import os
+import json
+import random
+import threading
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+FORMAT = 2
+CHUNK_SIZE = 64 * 1024
+_WHITESPACE = " \t\r\n"
+
+class PlaylistReader:
+    """
+    Reads a playlist file incrementally, a chunk at a time, so only the part that is needed gets
+    read and parsed.
+
+    Two layouts are understood: the original bare list of track dicts, and the current object
+    whose summary keys (``count``, ``duration``, ...) come before ``"tracks"``, so listing a
+    playlist only reads its first line.
+    """
+    def __init__(self, path: str, chunk_size: int = CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.file = open(path, "r", encoding="utf-8")
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.in_tracks = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        data = self.file.read(self.chunk_size)
+        if not data:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def _peek(self) -> str:
+        # Next non-whitespace character, "" at the end of the file
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def _expect(self, char: str):
+        found = self._peek()
+        if found != char:
+            raise ValueError(f"{self.path}: expected {char!r}, found {found or 'end of file'!r}")
+        self.pos += 1
+
+    def _value(self) -> Any:
+        self._peek()
+        decoder = json.JSONDecoder()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buffer, self.pos)
+                # A number cut off by the chunk boundary would still decode; make sure it ended
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    def header(self) -> dict[str, Any]:
+        """
+        Reads up to the start of the track list.
+
+        :return: The summary keys of a current file, {"format": 1} for a bare list.
+        """
+        first = self._peek()
+        if first == "[":
+            self.pos += 1
+            self.in_tracks = True
+            return {"format": 1}
+        self._expect("{")
+        header: dict[str, Any] = {}
+        while self._peek() != "}":
+            key = self._value()
+            self._expect(":")
+            if key == "tracks":
+                self._expect("[")
+                self.in_tracks = True
+                return header
+            header[key] = self._value()
+            if self._peek() == ",":
+                self.pos += 1
+        raise ValueError(f"{self.path}: no track list")
+
+    def tracks(self) -> Iterator[dict[str, Any]]:
+        """
+        Yields the track dicts one by one.
+        """
+        if not self.in_tracks:
+            self.header()
+        if self._peek() == "]":
+            return
+        while True:
+            yield self._value()
+            char = self._peek()
+            self.pos += 1
+            if char == "]":
+                return
+            if char != ",":
+                raise ValueError(f"{self.path}: expected ',' or ']', found {char or 'end of file'!r}")
+
+
+def read_header(path: str) -> dict[str, Any]:
+    with PlaylistReader(path, chunk_size=4096) as reader:
+        return reader.header()
+
+def iter_tracks(path: str) -> Iterator[dict[str, Any]]:
+    with PlaylistReader(path) as reader:
+        yield from reader.tracks()
+
+def list_playlists(directory: str) -> dict[str, dict[str, Any]]:
+    """
+    Names of the playlists in ``directory`` mapped to their headers. Unreadable files are listed
+    with an empty header rather than left out.
+    """
+    playlists = {}
+    for filename in os.listdir(directory):
+        if not filename.endswith(".json"):
+            continue
+        try:
+            header = read_header(os.path.join(directory, filename))
+        except (OSError, ValueError) as e:
+            print(f"Could not read playlist {filename}: {e}")
+            header = {}
+        playlists[filename[:-5]] = header
+    return playlists
+
+def write_playlist(path: str, entries: Iterable[dict[str, Any]], name: Optional[str] = None, seq: int = 0):
+    """
+    Writes the header line followed by one track per line, through a temporary file that
+    replaces ``path`` only once it is complete.
+
+    :param seq: Last journal operation contained in this snapshot.
+    """
+    entries = list(entries)
+    header = {
+        "format": FORMAT,
+        "name": name or os.path.splitext(os.path.basename(path))[0],
+        "count": len(entries),
+        "duration": sum(entry.get("duration") or 0 for entry in entries),
+        "seq": seq
+    }
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(header)[:-1] + ",\n\"tracks\": [")
+        for i, entry in enumerate(entries):
+            f.write(("\n" if i == 0 else ",\n") + json.dumps(entry))
+        f.write("\n]}\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def apply_op(entries: list, op: dict[str, Any]):
+    """
+    Replays one journal operation on a list of track dicts. The operations mirror the
+    PlaylistQueue methods that record them, so replay gives the same order.
+    """
+    kind = op["op"]
+    if kind == "add":
+        index = op["index"]
+        entries[index:index] = op["tracks"]
+    elif kind == "move":
+        entries.insert(op["to"], entries.pop(op["from"]))
+    elif kind == "remove":
+        for index in sorted(op["indexes"], reverse=True):
+            del entries[index]
+    elif kind == "shuffle":
+        random.Random(op["seed"]).shuffle(entries)
+    elif kind == "clear":
+        entries.clear()
+    elif kind == "rename":
+        for entry in entries:
+            if entry.get("path") == op["from"]:
+                entry["path"] = op["to"]
+    else:
+        raise ValueError(f"unknown playlist operation {kind!r}")
+
+
+class PlaylistJournal:
+    """
+    Append-only log of the edits made to one playlist since its snapshot was written.
+
+    Every operation is one JSON line. record() only queues the line and returns; a writer thread
+    appends whatever has queued up since its last write and syncs it with a single fsync, so a
+    burst of edits costs one sync and the UI thread never waits on the disk. A crash can lose
+    the last few milliseconds of edits; sync() waits until everything recorded is on disk.
+
+    Once ``compact_every`` operations have piled up the whole playlist is written to the snapshot
+    in the background and the operations it covers are dropped from the journal. Operations carry
+    a sequence number and the snapshot header keeps the last one it contains, so a crash between
+    the two steps never replays an operation twice.
+
+    :param path: The playlist's snapshot file; the journal sits next to it.
+    """
+    def __init__(self, path: str, compact_every: int = 500):
+        self.path = path
+        self.journal_path = os.path.splitext(path)[0] + ".journal"
+        self.name = os.path.splitext(os.path.basename(path))[0]
+        self.compact_every = compact_every
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()    # held while the journal file is appended to or rewritten
+        self.compact_lock = threading.Lock()  # one snapshot write at a time
+        self.seq = 0
+        self.snapshot_seq = 0
+        self.compacting = False
+        self.queued: list[str] = []  # lines recorded but not written yet, in seq order
+        self.writing = False
+
+    def pending(self) -> list[dict[str, Any]]:
+        """
+        Reads the operations that are not in the snapshot yet and sets ``seq`` past them.
+        A line torn by a crash mid-write ends the log.
+        """
+        try:
+            self.snapshot_seq = read_header(self.path).get("seq", 0) if os.path.exists(self.path) else 0
+        except (OSError, ValueError):
+            self.snapshot_seq = 0
+        ops = []
+        for op in self._read_ops():
+            if op["seq"] > self.snapshot_seq:
+                ops.append(op)
+        self.seq = max([self.snapshot_seq] + [op["seq"] for op in ops])
+        return ops
+
+    def _read_ops(self) -> list[dict[str, Any]]:
+        ops = []
+        try:
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        ops.append(json.loads(line))
+                    except ValueError:
+                        break
+        except FileNotFoundError:
+            pass
+        return ops
+
+    def record(self, op: dict[str, Any], snapshot: Optional[Callable[[], list]] = None):
+        """
+        Queues one operation for the writer thread.
+
+        :param snapshot: Returns the playlist's current tracks (objects with to_dict()); called
+            under the journal lock when a compaction is due.
+        """
+        with self.lock:
+            self.seq += 1
+            op["seq"] = self.seq
+            self.queued.append(json.dumps(op) + "\n")
+            if not self.writing:
+                self.writing = True
+                threading.Thread(target=self._write_loop, daemon=True).start()
+            if snapshot is None or self.compacting or self.seq - self.snapshot_seq < self.compact_every:
+                return
+            self.compacting = True
+            tracks, seq = snapshot(), self.seq
+        threading.Thread(target=self._compact_tracks, args=(tracks, seq), daemon=True).start()
+
+    def _write_loop(self):
+        # Lines recorded while a batch is being synced go out together in the next one
+        while True:
+            try:
+                with self.write_lock:
+                    self._write_queued()
+            except OSError as e:
+                print(f"Could not write the journal of playlist {self.name}: {e}")
+            with self.lock:
+                if not self.queued:
+                    self.writing = False
+                    return
+
+    def _write_queued(self):
+        # Caller holds write_lock, so batches reach the file in the order they were taken
+        with self.lock:
+            lines, self.queued = self.queued, []
+        if not lines:
+            return
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def sync(self):
+        """
+        Blocks until every operation recorded so far is on disk.
+        """
+        with self.write_lock:
+            self._write_queued()
+
+    def _compact_tracks(self, tracks: list, seq: int):
+        try:
+            self.compact((track.to_dict() for track in tracks), seq)
+        except OSError as e:
+            print(f"Could not compact playlist {self.name}: {e}")
+        finally:
+            self.compacting = False
+
+    def compact(self, entries: Iterable[dict[str, Any]], seq: Optional[int] = None):
+        """
+        Writes ``entries`` as the snapshot and drops every operation up to ``seq`` from the journal.
+
+        :param seq: Last operation reflected in ``entries``; defaults to the latest one recorded.
+        """
+        if seq is None:
+            with self.lock:
+                seq = self.seq
+        with self.compact_lock:
+            # A background compaction finishing late must not overwrite a newer snapshot
+            if seq < self.snapshot_seq:
+                return
+            write_playlist(self.path, entries, self.name, seq)
+            self._truncate(seq)
+
+    def dirty(self) -> bool:
+        # True while the journal holds operations the snapshot lacks
+        return self.seq > self.snapshot_seq
+
+    def _truncate(self, seq: int):
+        with self.write_lock:
+            # Queued lines go to the file first so the rewrite below keeps the ones after seq
+            self._write_queued()
+            with self.lock:
+                self.snapshot_seq = seq
+            remaining = [op for op in self._read_ops() if op["seq"] > seq]
+            if not remaining:
+                try:
+                    os.remove(self.journal_path)
+                except FileNotFoundError:
+                    pass
+                return
+            temp_path = self.journal_path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.writelines(json.dumps(op) + "\n" for op in remaining)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.journal_path)
@@ -0,0 +1,124 @@
+# scanner.py
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Iterable, Optional
+from mutagen.mp3 import MP3
+from utils.youtube import parse_filename
+
+def read_song_metadata(song_path: str, youtube_id: Optional[str] = None) -> dict[str, Any]:
+    """
+    Reads title, YouTube id and duration for one file.
+
+    Kept free of any player state so it can run in a thread or a worker process.
+    """
+    title, parsed_id = parse_filename(os.path.basename(song_path))
+    duration = None
+    try:
+        duration = int(MP3(song_path).info.length)
+    except Exception as e:
+        print(f"Could not read {song_path}: {e}")
+
+    return {
+        "title": title,
+        "duration": duration,
+        "path": song_path,
+        "youtube_id": parsed_id or youtube_id
+    }
+
+
+class LibraryScanner:
+    """
+    Fans tag and duration parsing out over a worker pool and streams the results back in batches.
+
+    :param on_batch: Called with a list of metadata dicts as they become available.
+    :param on_progress: Called with (done, total) at most every progress_interval seconds.
+    :param on_finished: Called with (count, cancelled) once a scan ends.
+    """
+    def __init__(self, on_batch: Callable[[list[dict]], None], on_progress: Optional[Callable[[int, int], None]] = None,
+                 on_finished: Optional[Callable[[int, bool], None]] = None, workers: Optional[int] = None,
+                 use_processes: bool = False, batch_size: int = 50, progress_interval: float = 0.25):
+        self.on_batch = on_batch
+        self.on_progress = on_progress
+        self.on_finished = on_finished
+        self.workers = workers or min(8, (os.cpu_count() or 2) + 2)
+        self.use_processes = use_processes
+        self.batch_size = batch_size
+        self.progress_interval = progress_interval
+        self.cancel_event = threading.Event()
+        self.lock = threading.Lock()
+        self.active = False
+        self.pending_paths = None
+
+    def is_running(self) -> bool:
+        return self.active
+
+    def scan(self, paths: Iterable[str]):
+        """
+        Starts scanning the given paths in the background. If a scan is already running the paths
+        are picked up as soon as it finishes.
+        """
+        with self.lock:
+            if self.active:
+                self.pending_paths = (self.pending_paths or []) + list(paths)
+                return
+            self.active = True
+            self.cancel_event.clear()
+            threading.Thread(target=self._run, args=(list(paths),), daemon=True).start()
+
+    def cancel(self):
+        with self.lock:
+            self.pending_paths = None
+        self.cancel_event.set()
+
+    def _run(self, paths: list[str]):
+        while paths is not None:
+            count = self._scan_paths(paths)
+            cancelled = self.cancel_event.is_set()
+            if self.on_finished:
+                self.on_finished(count, cancelled)
+            with self.lock:
+                paths, self.pending_paths = self.pending_paths, None
+                if cancelled:
+                    paths = None
+                if paths is None:
+                    self.active = False
+
+    def _scan_paths(self, paths: list[str]) -> int:
+        total = len(paths)
+        done = 0
+        batch = []
+        last_flush = time.monotonic()
+        if not total:
+            return 0
+
+        executor_class = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+        executor = executor_class(max_workers=self.workers)
+        try:
+            futures = [executor.submit(read_song_metadata, path) for path in paths]
+            for future in as_completed(futures):
+                if self.cancel_event.is_set():
+                    break
+                try:
+                    batch.append(future.result())
+                except Exception as e:
+                    print(f"Scan failed: {e}")
+                done += 1
+
+                now = time.monotonic()
+                if len(batch) >= self.batch_size or now - last_flush >= self.progress_interval:
+                    self._flush(batch, done, total)
+                    batch = []
+                    last_flush = now
+            if not self.cancel_event.is_set():
+                self._flush(batch, done, total)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        return done
+
+    def _flush(self, batch: list[dict], done: int, total: int):
+        if batch:
+            self.on_batch(batch)
+        if self.on_progress:
+            self.on_progress(done, total)
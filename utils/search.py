@@ -0,0 +1,58 @@
+# search.py
+from typing import Iterable
+
+def _trigrams(text: str) -> set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class SearchIndex:
+    """
+    Case-insensitive substring search over a fixed list of keys.
+
+    Built once per item set. Queries of three or more characters only verify the keys that share
+    every trigram with the query, shorter queries fall back to a scan of the pre-lowered keys.
+    When nothing contains the query, keys are ranked by trigram overlap instead (fuzzy mode).
+    """
+    def __init__(self, keys: Iterable[str], fuzzy: bool = True):
+        self.keys = list(keys)
+        self.lowered = [key.lower() for key in self.keys]
+        self.fuzzy = fuzzy
+        self.postings: dict[str, list[int]] = {}
+        for position, key in enumerate(self.lowered):
+            for trigram in _trigrams(key):
+                self.postings.setdefault(trigram, []).append(position)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def query(self, text: str) -> list[str]:
+        """
+        :return: Matching keys, in original order for substring hits or best-first for fuzzy hits.
+        """
+        text = text.lower()
+        if not text:
+            return list(self.keys)
+        if len(text) < 3:
+            return [self.keys[i] for i, key in enumerate(self.lowered) if text in key]
+
+        trigrams = _trigrams(text)
+        postings = sorted((self.postings.get(t, []) for t in trigrams), key=len)
+        if postings[0]:
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                candidates.intersection_update(posting)
+                if not candidates:
+                    break
+            matches = [i for i in sorted(candidates) if text in self.lowered[i]]
+            if matches:
+                return [self.keys[i] for i in matches]
+
+        if not self.fuzzy:
+            return []
+        scores: dict[int, int] = {}
+        for posting in postings:
+            for i in posting:
+                scores[i] = scores.get(i, 0) + 1
+        # Require at least half of the query's trigrams so noise does not show up as a result
+        threshold = max(1, len(trigrams) // 2)
+        ranked = sorted((i for i, score in scores.items() if score >= threshold), key=lambda i: (-scores[i], i))
+        return [self.keys[i] for i in ranked]
@@ -0,0 +1,198 @@
+# spectrum.py
+import os
+import zlib
+import hashlib
+import threading
+from typing import Optional
+import numpy as np
+import pygame
+from utils.pcm_cache import PCMCache
+from utils.loudness import SPECTRUM_RATE, SPECTRUM_BANDS, SPECTRUM_EDGES
+
+def spectrogram_file(directory: str, path: str) -> str:
+    return os.path.join(directory, hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest() + ".spec")
+
+def save_spectrogram(directory: str, path: str, frames: np.ndarray):
+    """
+    Stores the analysis pass's spectrogram for ``path``, zlib-compressed (a few hundred bytes per second).
+    """
+    os.makedirs(directory, exist_ok=True)
+    target = spectrogram_file(directory, path)
+    with open(target + ".tmp", "wb") as f:
+        f.write(zlib.compress(np.ascontiguousarray(frames, dtype=np.uint8).tobytes()))
+    os.replace(target + ".tmp", target)
+
+def load_spectrogram(directory: str, path: str) -> Optional[np.ndarray]:
+    try:
+        with open(spectrogram_file(directory, path), "rb") as f:
+            data = zlib.decompress(f.read())
+    except (OSError, zlib.error):
+        return None
+    if not data or len(data) % SPECTRUM_BANDS:
+        return None
+    return np.frombuffer(data, dtype=np.uint8).reshape(-1, SPECTRUM_BANDS)
+
+def mixer_samples(raw, mixer_format: tuple[int, int, int]) -> np.ndarray:
+    """
+    Views raw mixer-format bytes as a (frames, channels) array without copying.
+
+    :param mixer_format: pygame.mixer.get_init() result: (frequency, size, channels).
+    """
+    _, size, channels = mixer_format
+    dtypes = {8: np.uint8, -8: np.int8, 16: np.uint16, -16: np.int16, 32: np.float32, -32: np.int32}
+    samples = np.frombuffer(raw, dtype=dtypes.get(size, np.int16))
+    return samples[:len(samples) - len(samples) % channels].reshape(-1, channels)
+
+def to_mono(samples: np.ndarray, factor: int) -> np.ndarray:
+    """
+    Downmixes to mono float32 in -1..1 and decimates by ``factor`` by averaging neighbouring frames.
+    """
+    frames = len(samples) - len(samples) % factor
+    mono = samples[:frames].reshape(-1, factor, samples.shape[1]).mean(axis=(1, 2), dtype=np.float32)
+    if samples.dtype == np.int16:
+        mono /= 32768
+    elif samples.dtype == np.int32:
+        mono /= 2 ** 31
+    elif samples.dtype == np.uint16:
+        mono = (mono - 32768) / 32768
+    elif samples.dtype in (np.uint8, np.int8):
+        mono = (mono - (128 if samples.dtype == np.uint8 else 0)) / 128
+    return mono.astype(np.float32, copy=False)
+
+
+class SpectrumAnalyzer:
+    """
+    Log-spaced spectrum of the playing track at a given position.
+
+    Tracks that went through the loudness analysis have a stored spectrogram in ``spectra_dir``;
+    it is loaded instead of decoding the track and levels_at() only looks up a row. Other tracks
+    are decoded once in the background into a low-rate mono copy (about 10 MB for four minutes),
+    read straight from the PCM cache when possible. Every call to levels_at() then costs one
+    small FFT and a reduceat, all into preallocated buffers, independent of the track length.
+
+    :param bars: Number of frequency bands. Bands too narrow to hold one FFT bin are merged,
+        so ``bar_count`` may end up lower.
+    :param decay: Fraction of the previous level a band keeps per update, so bars fall smoothly.
+    """
+    def __init__(self, bars: int = 48, fft_size: int = 1024, sample_rate: int = 11025,
+                 min_freq: float = 40.0, floor_db: float = -60.0, decay: float = 0.85,
+                 spectra_dir: Optional[str] = None):
+        self.fft_size = fft_size
+        self.target_rate = sample_rate
+        self.sample_rate = sample_rate
+        self.floor_db = floor_db
+        self.decay = decay
+        self.window = np.hanning(fft_size).astype(np.float32)
+        self.frame = np.zeros(fft_size, dtype=np.float32)
+        self.spectrum = np.zeros(fft_size // 2 + 1, dtype=np.complex64)
+        self.magnitude = np.zeros(fft_size // 2 + 1, dtype=np.float32)
+
+        frequencies = np.fft.rfftfreq(fft_size, 1 / sample_rate)
+        edges = np.geomspace(min_freq, sample_rate / 2, bars + 1)
+        self.edges = np.unique(np.searchsorted(frequencies, edges[:-1]))
+        self.bar_count = len(self.edges)
+        self.bands = np.zeros(self.bar_count, dtype=np.float32)
+        self.levels = np.zeros(self.bar_count, dtype=np.float32)  # 0..1, read by the widget
+        self.peak_buffer = np.zeros((), dtype=np.float32)
+        self.peak = 0.0                                            # highest level, for idle checks
+        # Stored spectrogram band each bar reads, by the bar's lower edge frequency
+        self.band_map = np.clip(np.searchsorted(SPECTRUM_EDGES, frequencies[self.edges], side="right") - 1, 0, SPECTRUM_BANDS - 1)
+        self.row = np.zeros(self.bar_count, dtype=np.uint8)
+        self.spectra_dir = spectra_dir
+        # Full-scale sine through a Hann window peaks at fft_size / 4
+        self.reference = fft_size / 4
+
+        self.lock = threading.Lock()
+        self.path: Optional[str] = None
+        self.samples: Optional[np.ndarray] = None
+        self.spectrogram: Optional[np.ndarray] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.samples is not None or self.spectrogram is not None
+
+    def load(self, path: Optional[str], pcm_cache: Optional[PCMCache] = None):
+        """
+        Switches to a new track; decoding runs on a background thread. None clears the samples.
+        """
+        with self.lock:
+            if path == self.path:
+                return
+            self.path = path
+            self.samples = None
+            self.spectrogram = None
+        if path is not None:
+            threading.Thread(target=self._decode, args=(path, pcm_cache), daemon=True).start()
+
+    def _decode(self, path: str, pcm_cache: Optional[PCMCache]):
+        spectrogram = load_spectrogram(self.spectra_dir, path) if self.spectra_dir else None
+        if spectrogram is not None:
+            with self.lock:
+                if path == self.path:
+                    self.spectrogram = spectrogram
+            return
+        mixer_format = pygame.mixer.get_init()
+        if not mixer_format:
+            return
+        factor = max(1, mixer_format[0] // self.target_rate)
+        try:
+            # A cached track is already decoded; read it straight from the memory map
+            mapped = pcm_cache.get(path, count=False) if pcm_cache is not None else None
+            if mapped is not None:
+                try:
+                    mono = to_mono(mixer_samples(mapped, mixer_format), factor)
+                finally:
+                    mapped.close()
+            else:
+                raw = pygame.mixer.Sound(path).get_raw()
+                mono = to_mono(mixer_samples(raw, mixer_format), factor)
+        except Exception as e:
+            print(f"Could not decode {path} for the visualizer: {e}")
+            return
+        with self.lock:
+            if path == self.path:
+                self.samples = mono
+                self.sample_rate = mixer_format[0] / factor
+
+    def levels_at(self, position: float) -> np.ndarray:
+        """
+        Updates and returns ``levels`` for the window ending at position (seconds). Decays towards
+        zero when no samples are loaded.
+        """
+        np.multiply(self.levels, self.decay, out=self.levels)
+        self._measure(position)
+        self.levels.max(out=self.peak_buffer)
+        self.peak = float(self.peak_buffer)
+        return self.levels
+
+    def _measure(self, position: float):
+        # Raises self.levels to the bands at position, from the spectrogram or the decoded samples
+        spectrogram = self.spectrogram
+        if spectrogram is not None:
+            if position < 0 or not len(spectrogram):
+                return
+            np.take(spectrogram[min(len(spectrogram) - 1, int(position * SPECTRUM_RATE))], self.band_map, out=self.row)
+            np.multiply(self.row, 1 / 255, out=self.bands)
+            np.maximum(self.levels, self.bands, out=self.levels)
+            return
+        samples = self.samples
+        if samples is None:
+            return
+        end = min(len(samples), int(position * self.sample_rate))
+        start = end - self.fft_size
+        if start < 0:
+            return
+
+        np.multiply(samples[start:end], self.window, out=self.frame)
+        np.fft.rfft(self.frame, out=self.spectrum)
+        np.abs(self.spectrum, out=self.magnitude)
+        # Loudest bin per band, so wide high bands are not diluted by their empty bins
+        np.maximum.reduceat(self.magnitude, self.edges, out=self.bands)
+        # Band magnitude to 0..1 over floor_db..0 dBFS
+        np.maximum(self.bands, 1e-9, out=self.bands)
+        np.divide(self.bands, self.reference, out=self.bands)
+        np.log10(self.bands, out=self.bands)
+        np.multiply(self.bands, 20 / -self.floor_db, out=self.bands)
+        np.add(self.bands, 1, out=self.bands)
+        np.clip(self.bands, 0, 1, out=self.bands)
+        np.maximum(self.levels, self.bands, out=self.levels)
@@ -0,0 +1,47 @@
+# startup.py
+import json
+import time
+from typing import Optional
+
+class StartupTimer:
+    """
+    Records how long each startup phase took, so time-to-first-frame can be tracked across runs.
+
+    Phases are marked in order; finish() appends one JSON line per start to ``log_file`` with the
+    duration of every phase and the total, all in milliseconds.
+
+    :param started: perf_counter() value the measurement starts from, e.g. taken before the heavy imports.
+    """
+    def __init__(self, log_file: Optional[str] = None, started: Optional[float] = None):
+        self.log_file = log_file
+        self.started = started if started is not None else time.perf_counter()
+        self.last = self.started
+        self.phases: dict[str, float] = {}
+        self.finished = False
+
+    def mark(self, phase: str):
+        now = time.perf_counter()
+        self.phases[phase] = round((now - self.last) * 1000, 1)
+        self.last = now
+
+    def total_ms(self) -> float:
+        return round((self.last - self.started) * 1000, 1)
+
+    def finish(self, log_file: Optional[str] = None):
+        """
+        Writes the record once; later calls are ignored.
+        """
+        if self.finished:
+            return
+        self.finished = True
+        log_file = log_file or self.log_file
+        record = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "total_ms": self.total_ms(), "phases": self.phases}
+        print(f"Startup: first frame after {record['total_ms']:.0f} ms " +
+              ", ".join(f"{phase} {ms:.0f}" for phase, ms in self.phases.items()))
+        if not log_file:
+            return
+        try:
+            with open(log_file, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            print(f"Could not write startup timings: {e}")
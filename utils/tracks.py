@@ -0,0 +1,263 @@
+# tracks.py
+import random
+import threading
+from array import array
+from typing import Any, Iterable, Iterator, Optional, Union
+
+class Track:
+    """
+    One song as held in memory by the player. Uses ``__slots__`` instead of a dict, and supports
+    ``track["path"]`` / ``track.get("duration")`` so code written against the old dicts keeps working.
+
+    ``missing`` is set once the file was found to be gone; it is not saved with the playlist.
+    """
+    __slots__ = ("id", "title", "path", "duration", "youtube_id", "missing")
+    fields = ("title", "youtube_id", "path", "duration")
+
+    def __init__(self, id: int, title: str, path: str, duration: Optional[int] = None, youtube_id: Optional[str] = None):
+        self.id = id
+        self.title = title
+        self.path = path
+        self.duration = duration
+        self.youtube_id = youtube_id
+        self.missing = False
+
+    def __getitem__(self, key: str):
+        if key not in self.fields:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default=None):
+        value = getattr(self, key, None) if key in self.fields else None
+        return default if value is None else value
+
+    def to_dict(self) -> dict[str, Any]:
+        # Same shape as the playlist JSON entries
+        return {"title": self.title, "youtube_id": self.youtube_id, "path": self.path, "duration": self.duration}
+
+    def __repr__(self):
+        return f"Track({self.id}, {self.title!r})"
+
+
+class TrackTable:
+    """
+    Shared table of every track the player has seen, interned by path.
+
+    Each path gets one Track and a small integer id for the lifetime of the process, so queues
+    can store ids instead of copies of the metadata.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tracks: list[Track] = []
+        self.ids: dict[str, int] = {}
+
+    def __len__(self):
+        return len(self.tracks)
+
+    def __getitem__(self, track_id: int) -> Track:
+        return self.tracks[track_id]
+
+    def add(self, entry: Union[Track, dict[str, Any]]) -> int:
+        """
+        Interns a track dict (or Track) and returns its id. A known path keeps its id, has its
+        title, duration and youtube_id refreshed from ``entry`` and loses its missing flag.
+        """
+        if isinstance(entry, Track):
+            entry = entry.to_dict()
+        path = entry["path"]
+        with self.lock:
+            track_id = self.ids.get(path)
+            if track_id is None:
+                track_id = len(self.tracks)
+                self.tracks.append(Track(track_id, entry.get("title") or "", path, entry.get("duration"), entry.get("youtube_id")))
+                self.ids[path] = track_id
+            else:
+                track = self.tracks[track_id]
+                track.title = entry.get("title") or track.title
+                track.duration = entry.get("duration", track.duration)
+                track.youtube_id = entry.get("youtube_id", track.youtube_id)
+                track.missing = False
+            return track_id
+
+    def lookup(self, path: str) -> Optional[int]:
+        return self.ids.get(path)
+
+    def rename(self, src: str, dest: str):
+        """
+        Follows a moved file; queues holding the id see the new path. Use PlaylistQueue.rename_path
+        to have a journaled queue record it.
+        """
+        with self.lock:
+            track_id = self.ids.pop(src, None)
+            if track_id is None:
+                return
+            self.ids[dest] = track_id
+            self.tracks[track_id].path = dest
+            self.tracks[track_id].missing = False
+
+    def restore(self, paths: Iterable[str]) -> int:
+        """
+        Clears the missing flag of tracks whose files have come back.
+
+        :return: How many tracks were flagged.
+        """
+        restored = 0
+        with self.lock:
+            for path in paths:
+                track_id = self.ids.get(path)
+                if track_id is not None and self.tracks[track_id].missing:
+                    self.tracks[track_id].missing = False
+                    restored += 1
+        return restored
+
+
+class PlaylistQueue:
+    """
+    The play queue as an array of track ids into a TrackTable, 4 bytes per entry. Indexing
+    returns the shared Track objects; reordering and shuffling only move integers.
+
+    Every mutation bumps ``version``, so widgets can cache anything derived from the queue until
+    it changes. With a ``journal`` attached (see utils.playlists.PlaylistJournal) every mutation is
+    also recorded as an operation that replays to the same order.
+
+    The queue is edited from the UI, download and watcher threads. ``lock`` is held across each
+    mutation and its journal record, so the journal order is the order the edits were applied in;
+    hold it too when reading the queue and attaching or compacting its journal as one step.
+    """
+    def __init__(self, table: TrackTable, entries: Iterable[Union[Track, dict[str, Any]]] = ()):
+        self.table = table
+        self.ids = array("i")
+        self.version = 0
+        self.journal = None
+        self.lock = threading.RLock()
+        self.extend(entries)
+
+    def _record(self, op: dict[str, Any]):
+        if self.journal is not None:
+            self.journal.record(op, snapshot=lambda: list(self))
+
+    def _track_dicts(self, ids: Iterable[int]) -> list[dict[str, Any]]:
+        return [self.table.tracks[track_id].to_dict() for track_id in ids]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __bool__(self):
+        return len(self.ids) > 0
+
+    def __iter__(self) -> Iterator[Track]:
+        tracks = self.table.tracks
+        return (tracks[track_id] for track_id in self.ids)
+
+    def __getitem__(self, index: int) -> Track:
+        return self.table.tracks[self.ids[index]]
+
+    def append(self, entry: Union[Track, dict[str, Any]]):
+        self.extend([entry])
+
+    def extend(self, entries: Iterable[Union[Track, dict[str, Any]]]):
+        added = array("i", (self.table.add(entry) for entry in entries))
+        if not added:
+            return
+        with self.lock:
+            index = len(self.ids)
+            self.ids.extend(added)
+            self.version += 1
+            self._record({"op": "add", "index": index, "tracks": self._track_dicts(added)})
+
+    def insert(self, index: int, entry: Union[Track, dict[str, Any]]):
+        track_id = self.table.add(entry)
+        with self.lock:
+            if index < 0:
+                index += len(self.ids)
+            index = max(0, min(index, len(self.ids)))
+            self.ids.insert(index, track_id)
+            self.version += 1
+            self._record({"op": "add", "index": index, "tracks": self._track_dicts([track_id])})
+
+    def pop(self, index: int = -1) -> Track:
+        with self.lock:
+            if index < 0:
+                index += len(self.ids)
+            track_id = self.ids.pop(index)
+            self.version += 1
+            self._record({"op": "remove", "indexes": [index]})
+        return self.table.tracks[track_id]
+
+    def move(self, src: int, dest: int):
+        if src == dest:
+            # A click without a drag; nothing to redraw or journal
+            return
+        with self.lock:
+            self.ids.insert(dest, self.ids.pop(src))
+            self.version += 1
+            self._record({"op": "move", "from": src, "to": dest})
+
+    def rename_path(self, src: str, dest: str):
+        """
+        Follows a moved file through the shared TrackTable and journals the new path if the track
+        is in this queue, so the saved playlist picks it up too.
+        """
+        with self.lock:
+            track_id = self.table.lookup(src)
+            self.table.rename(src, dest)
+            if track_id is None or track_id not in self.ids:
+                return
+            self.version += 1
+            self._record({"op": "rename", "from": src, "to": dest})
+
+    def touch(self):
+        # For changes to the tracks themselves, e.g. a missing flag, that should redraw the queue
+        self.version += 1
+
+    def clear(self):
+        with self.lock:
+            self.ids = array("i")
+            self.version += 1
+            self._record({"op": "clear"})
+
+    def shuffle(self, seed: Optional[int] = None):
+        """
+        Shuffles in place. The same seed always produces the same order for the same queue, so
+        only the seed needs to be journaled.
+        """
+        if seed is None:
+            seed = random.getrandbits(32)
+        with self.lock:
+            random.Random(seed).shuffle(self.ids)
+            self.version += 1
+            self._record({"op": "shuffle", "seed": seed})
+
+    def index_of(self, path: str, start: int = 0) -> Optional[int]:
+        track_id = self.table.lookup(path)
+        if track_id is None:
+            return None
+        try:
+            return self.ids.index(track_id, start)
+        except ValueError:
+            return None
+
+    def remove_paths(self, paths: Iterable[str], before: int = 0) -> tuple[list[Track], int]:
+        """
+        Drops every entry whose path is in ``paths``.
+
+        :param before: Position to report on, usually the playing index.
+        :return: (removed tracks, how many of them were queued before ``before``).
+        """
+        drop = {self.table.lookup(path) for path in paths} - {None}
+        if not drop:
+            return [], 0
+        with self.lock:
+            indexes = [index for index, track_id in enumerate(self.ids) if track_id in drop]
+            if not indexes:
+                return [], 0
+            removed = [self.table.tracks[self.ids[index]] for index in indexes]
+            removed_before = sum(1 for index in indexes if index < before)
+            self.ids = array("i", (track_id for track_id in self.ids if track_id not in drop))
+            self.version += 1
+            self._record({"op": "remove", "indexes": indexes})
+        return removed, removed_before
+
+    def to_dicts(self) -> list[dict[str, Any]]:
+        with self.lock:
+            return [track.to_dict() for track in self]
@@ -1,24 +1,56 @@
 # ui_framework.py
 import math
-from typing import Any, Callable, Optional
+from typing import Any, Callable, NamedTuple, Optional
 import pygame
 import json
 import re
 import time
 import threading
 import pathlib
+import queue
+import copy
+import hashlib
+from types import MappingProxyType
+from collections import OrderedDict
 import pyclip
 
 class StyleManager:
     def __init__(self, style_file):
         with open(style_file, "r") as f:
             self.styles = json.load(f)
+        # (style name, state) -> flattened read-only style, see resolve()
+        self.resolved: dict[tuple[str, str], MappingProxyType] = {}
 
     def get_style(self, widget_type, state="default"):
         return self.styles.get(widget_type, {}).get(state, {})
     
     def add_style(self, style_dict: dict, style_name: str):
         self.styles[style_name] = style_dict
+        for key in [key for key in self.resolved if key[0] == style_name]:
+            del self.resolved[key]
+
+    def resolve(self, style_name, state="default") -> MappingProxyType:
+        """
+        Returns the style for a state flattened over the "default" state, as a shared read-only
+        mapping. Each (style name, state) pair is only merged once.
+        """
+        key = (style_name, state)
+        resolved = self.resolved.get(key)
+        if resolved is None:
+            states = self.styles.get(style_name, {})
+            merged = dict(states.get("default", {}))
+            merged.update(states.get(state, {}))
+            resolved = MappingProxyType({k: tuple(v) if isinstance(v, list) else v for k, v in merged.items()})
+            self.resolved[key] = resolved
+        return resolved
+
+    def resolve_states(self, style_name, base_state="default") -> dict[str, MappingProxyType]:
+        """
+        Precomputes the resolved style of every state a style defines. base_state is used as "default".
+        """
+        states = {state: self.resolve(style_name, state) for state in self.styles.get(style_name, {})}
+        states["default"] = self.resolve(style_name, base_state)
+        return states
     
 class Event:
     def __init__(self, type, data = {}):
@@ -47,16 +79,118 @@ class UIEventRegistry:
 
 GlobalEventRegistry = UIEventRegistry()
 
+_MISSING = object()
+
+# ---- Fonts and text ----
+_fonts: dict[tuple[Optional[str], int], pygame.font.Font] = {}
+
+def get_font(family: Optional[str], size: int) -> pygame.font.Font:
+    """
+    Returns a shared font for (family, size), resolving the system font only the first time.
+    """
+    key = (family or None, int(size))
+    font = _fonts.get(key)
+    if font is None:
+        font = pygame.font.SysFont(key[0], key[1])
+        _fonts[key] = font
+    return font
+
+
+class TextCache:
+    """
+    LRU cache of rendered text surfaces keyed by (font, text, color, antialias).
+
+    Evicts least recently used surfaces once their combined pixel memory exceeds max_bytes.
+    Returned surfaces are shared, callers must only blit them.
+    """
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.surfaces: OrderedDict[tuple, pygame.Surface] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font: pygame.font.Font, text: str, color, antialias: bool = True) -> pygame.Surface:
+        key = (font, text, tuple(color), antialias)
+        surf = self.surfaces.get(key)
+        if surf is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            return surf
+        self.misses += 1
+        surf = font.render(text, antialias, color)
+        size = surf.get_width() * surf.get_height() * surf.get_bytesize()
+        self.surfaces[key] = surf
+        self.bytes += size
+        while self.bytes > self.max_bytes and len(self.surfaces) > 1:
+            _, old = self.surfaces.popitem(last=False)
+            self.bytes -= old.get_width() * old.get_height() * old.get_bytesize()
+        return surf
+
+    def clear(self):
+        self.surfaces.clear()
+        self.bytes = 0
+
+text_cache = TextCache()
+
+def render_text(font: pygame.font.Font, text: str, color, antialias: bool = True) -> pygame.Surface:
+    return text_cache.render(font, text, color, antialias)
+
+CURSOR_BLINK_MS = 500
+
+def cursor_blink_on() -> bool:
+    # Time based so the blink rate does not depend on the frame rate
+    return (pygame.time.get_ticks() // CURSOR_BLINK_MS) % 2 == 0
+
 class Widget:
+    # Runtime state carried over when a hot reload rebuilds the widget
+    live_state: tuple[str, ...] = ()
+    # Assigning a new value to any of these marks the widget for redraw in retained mode
+    redraw_attrs = frozenset(("rect", "style", "state", "visible", "text", "value", "active", "query", "scroll", "selected", "items", "enabled"))
+
     def __init__(self, rect, style, name = ""):
+        self.dirty = True
         self.rect = pygame.Rect(rect)
         self.style = style
+        self.styles = {"default": style}
         self.state = "default"
         self.visible = True
         self.name = name
 
+    def __setattr__(self, name, value):
+        if name in self.redraw_attrs and self.__dict__.get(name, _MISSING) != value:
+            self.__dict__["dirty"] = True
+        object.__setattr__(self, name, value)
+
+    def mark_dirty(self):
+        self.dirty = True
+
+    def needs_redraw(self):
+        """
+        Returns True if the widget has to be redrawn this frame in retained mode.
+        Widgets with animations or externally driven content override this.
+        """
+        return self.__dict__.get("dirty", True)
+
+    def set_styles(self, styles: dict[str, Any]):
+        """
+        Gives the widget its precomputed per-state styles and selects the one for the current state.
+        """
+        self.styles = styles
+        self.set_state(self.state)
+
+    def set_state(self, state: str):
+        # Switching state only swaps a reference to a precomputed style
+        if state == self.state and self.style is self.styles.get(state, self.style):
+            return
+        self.state = state
+        style = self.styles.get(state) or self.styles.get("default")
+        if style is not None and style is not self.style:
+            object.__setattr__(self, "style", style)
+            self.dirty = True
+
     def apply_style(self, style):
-        self.style.update(style)
+        self.style = MappingProxyType({**self.style, **style})
 
     def handle_event(self, event):
         
@@ -71,42 +205,44 @@ class Widget:
 
 
 class Button(Widget):
+    live_state = ("state",)
+
     def __init__(self, rect, style, text, fire_event="", name = "", border_radius = 0, font: Optional[str] = None, font_size: Optional[int] = None):
         super().__init__(rect, style, name)
         self.text = text
         self.callback = fire_event
-        self.font = pygame.font.SysFont(font or self.style.get("font", None), font_size or self.style.get("font_size", 24))
+        self.font = get_font(font or self.style.get("font", None), font_size or self.style.get("font_size", 24))
         self.border_radius = border_radius
 
     def handle_event(self, event):
         if event.type == pygame.MOUSEBUTTONDOWN and self.rect.collidepoint(event.pos):
-            self.state = "pressed"
+            self.set_state("pressed")
             if self.callback:
                 GlobalEventRegistry.dispatch(Event(self.callback))
         elif event.type == pygame.MOUSEMOTION:
             if self.rect.collidepoint(event.pos):
-                self.state = "hover"
+                self.set_state("hover")
             else:
-                self.state = "default"
+                self.set_state("default")
 
     def draw(self, surface):
         if not self.visible:
             return
-        if self.state in self.style:
-            self.apply_style(self.style[self.state])
         bg = self.style.get("bg_color", (200, 200, 200))
         fg = self.style.get("fg_color", (0, 0, 0))
         pygame.draw.rect(surface, bg, self.rect, border_radius=self.border_radius)
-        text_surf = self.font.render(self.text, True, fg)
+        text_surf = render_text(self.font, self.text, fg)
         text_rect = text_surf.get_rect(center=self.rect.center)
         surface.blit(text_surf, text_rect)
 
 
 class Label(Widget):
+    live_state = ("text",)
+
     def __init__(self, rect, style, text, name = "", font: Optional[str] = None, font_size: Optional[int] = None):
         super().__init__(rect, style, name)
         self.text = text
-        self.font = pygame.font.SysFont(font or self.style.get("font", None), font_size or self.style.get("font_size", 24))
+        self.font = get_font(font or self.style.get("font", None), font_size or self.style.get("font_size", 24))
 
     def set_text(self, text):
         self.text = text
@@ -115,19 +251,24 @@ class Label(Widget):
         if not self.visible:
             return
         fg = self.style.get("fg_color", (255, 255, 255))
-        text_surf = self.font.render(self.text, True, fg)
+        text_surf = render_text(self.font, self.text, fg)
         text_rect = text_surf.get_rect(topleft=self.rect.topleft)
+        # Clipped to the rect, the only area a dirty redraw clears
+        clip = surface.get_clip()
+        surface.set_clip(self.rect.clip(clip))
         surface.blit(text_surf, text_rect)
+        surface.set_clip(clip)
 
 
 class TextBox(Widget):
+    live_state = ("text", "active")
+
     def __init__(self, rect, style, text="", name = "", border_radius = 0, font: Optional[str] = None, font_size: Optional[int] = None, default_text = None):
         super().__init__(rect, style, name)
         self.text = text
-        self.font = pygame.font.SysFont(font or self.style.get("font", None), font_size or self.style.get("font_size", 24))
+        self.font = get_font(font or self.style.get("font", None), font_size or self.style.get("font_size", 24))
         self.active = False
         self.cursor_visible = True
-        self.cursor_timer = 0
         self.border_radius = border_radius
         self.default_text = default_text
         self.mod = {
@@ -181,9 +322,13 @@ class TextBox(Widget):
             elif event.key == pygame.K_BACKSPACE:
                 self.mod["backspace"] = False
 
+    def needs_redraw(self):
+        # The blinking cursor animates while the box has focus
+        return super().needs_redraw() or (self.active and cursor_blink_on() != self.cursor_visible)
+
     def draw(self, surface):
         clip = surface.get_clip()
-        surface.set_clip(self.rect)
+        surface.set_clip(self.rect.clip(clip))
         bg = self.style.get("bg_color", (255, 255, 255))
         fg = self.style.get("fg_color", (0, 0, 0))
         pygame.draw.rect(surface, bg, self.rect, border_radius=self.border_radius)
@@ -193,7 +338,7 @@ class TextBox(Widget):
             text = self.default_text or self.style.get("default_text", "")
         else:
             text = self.text
-        text_surf = self.font.render(text, True, fg)
+        text_surf = render_text(self.font, text, fg)
         tw, th = text_surf.get_size()
         #surface.blit(text_surf, (self.rect.x + 5, self.rect.y + 5))
         #Draw the text from the left side of the box and shifts it to the left if the text is too long
@@ -205,9 +350,9 @@ class TextBox(Widget):
         surface.set_clip(clip)
 
         # blinking cursor
+        self.cursor_visible = cursor_blink_on()
         if self.active:
-            self.cursor_timer = (self.cursor_timer + 1) % 60
-            if self.cursor_timer < 30:
+            if self.cursor_visible:
                 if offset < 0:
                     cursor_x = self.rect.x + (self.rect.w - 5)
                 else:
@@ -217,6 +362,8 @@ class TextBox(Widget):
 
 
 class Slider(Widget):
+    live_state = ("value",)
+
     def __init__(self, rect, style, min_val=0, max_val=100, start_val=50, fire_event="", name = "", border_radius = 0):
         super().__init__(rect, style, name)
         self.min_val = min_val
@@ -268,6 +415,8 @@ class UIManager:
     def __init__(self):
         self.widgets = []
         self.named_widgets = {}
+        self.scene_name = None
+        self.signatures: dict[str, str] = {}  # widget name -> compiled signature, used by hot reload
 
     def add(self, widget):
         self.widgets.append(widget)
@@ -281,6 +430,151 @@ class UIManager:
     def draw(self, surface):
         for w in self.widgets:
             w.draw(surface)
+            w.dirty = False
+            w.last_drawn_rect = w.rect.copy()
+
+    def draw_dirty(self, surface, background) -> list[pygame.Rect]:
+        """
+        Retained-mode draw: only repaints the areas of widgets that need a redraw.
+
+        Every widget overlapping a dirty area is redrawn in order, clipped to that area,
+        so overlapping widgets keep their stacking.
+
+        :param surface: The surface the UI was last fully drawn to.
+        :param background: Color used to clear a dirty area before repainting it.
+        :return: The rects that changed, for pygame.display.update.
+        """
+        dirty = [w for w in self.widgets if w.needs_redraw()]
+        if not dirty:
+            return []
+        rects = [w.rect.copy() for w in dirty]
+        # Also clear where a moved or resized widget used to be
+        for w in dirty:
+            last = w.__dict__.get("last_drawn_rect")
+            if last is not None and last != w.rect:
+                rects.append(last)
+
+        clip = surface.get_clip()
+        for rect in rects:
+            surface.set_clip(rect)
+            surface.fill(background, rect)
+            for w in self.widgets:
+                if w.rect.colliderect(rect):
+                    w.draw(surface)
+        surface.set_clip(clip)
+        for w in dirty:
+            w.dirty = False
+            w.last_drawn_rect = w.rect.copy()
+        return rects
+
+class WakeQueue(queue.Queue):
+    """
+    A queue.Queue that posts ``wake_event`` on every put, so a main loop blocked in
+    pygame.event.wait wakes up as soon as a background thread sends it a message.
+    """
+    def __init__(self, wake_event: int, maxsize: int = 0):
+        super().__init__(maxsize)
+        self.wake_event = wake_event
+        self.wake_pending = threading.Event()
+
+    def put(self, item, block=True, timeout=None):
+        super().put(item, block, timeout)
+        # One pending wake-up is enough, the loop drains the whole queue when it runs
+        if not self.wake_pending.is_set():
+            self.wake_pending.set()
+            try:
+                pygame.event.post(pygame.event.Event(self.wake_event))
+            except pygame.error:
+                pass
+
+    def get_nowait(self):
+        self.wake_pending.clear()
+        return super().get_nowait()
+
+
+class FrameScheduler:
+    """
+    Adaptive frame pacing for the main loop.
+
+    While there is input (or the caller reports animation) the loop runs at ``active_fps``.
+    After ``idle_after`` seconds without input it blocks in pygame.event.wait, waking for any
+    event or after ``idle_timeout`` seconds (``background_timeout`` when the window is
+    minimised or unfocused). Posted events such as the track end event or a WakeQueue
+    wake-up end the wait immediately.
+
+    ``frame_time`` is the smoothed time spent working per frame in milliseconds and
+    ``idle_percent`` the smoothed share of wall time spent waiting.
+    """
+    INPUT_EVENTS = (pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP, pygame.MOUSEMOTION, pygame.MOUSEWHEEL,
+                    pygame.KEYDOWN, pygame.KEYUP, pygame.TEXTINPUT)
+
+    def __init__(self, active_fps: int = 60, idle_after: float = 0.5, idle_timeout: float = 0.25,
+                 background_timeout: float = 1.0, smoothing: float = 0.05):
+        self.frame_budget = 1 / active_fps
+        self.idle_after = idle_after
+        self.idle_timeout = idle_timeout
+        self.background_timeout = background_timeout
+        self.smoothing = smoothing
+        self.last_activity = time.perf_counter()
+        self.focused = True
+        self.animating = False
+        self.frame_start = time.perf_counter()
+        self.frame_time = 0.0
+        self.idle_percent = 0.0
+        self.waited = 0.0
+
+    def is_idle(self) -> bool:
+        return not self.animating and time.perf_counter() - self.last_activity >= self.idle_after
+
+    def is_visible(self) -> bool:
+        # False while the window is minimised or unfocused; animations should pause then
+        return self.focused and pygame.display.get_active()
+
+    def poke(self):
+        """
+        Switches back to the active frame rate, e.g. after a programmatic UI change.
+        """
+        self.last_activity = time.perf_counter()
+
+    def get_events(self) -> list:
+        """
+        Returns this frame's events, blocking while the UI is idle.
+        """
+        self.frame_start = time.perf_counter()
+        self.waited = 0.0
+        if self.is_idle():
+            timeout = self.idle_timeout if self.is_visible() else self.background_timeout
+            event = pygame.event.wait(int(timeout * 1000))
+            self.waited = time.perf_counter() - self.frame_start
+            events = [] if event.type == pygame.NOEVENT else [event]
+            events.extend(pygame.event.get())
+        else:
+            events = pygame.event.get()
+
+        for event in events:
+            if event.type in self.INPUT_EVENTS:
+                self.last_activity = time.perf_counter()
+            elif event.type in (pygame.WINDOWFOCUSLOST, pygame.WINDOWMINIMIZED):
+                self.focused = False
+            elif event.type in (pygame.WINDOWFOCUSGAINED, pygame.WINDOWRESTORED):
+                self.focused = True
+                self.last_activity = time.perf_counter()
+        return events
+
+    def end_frame(self):
+        """
+        Paces the frame when active and updates the frame time and idle statistics.
+        """
+        now = time.perf_counter()
+        busy = now - self.frame_start - self.waited
+        sleep = 0.0
+        if not self.is_idle():
+            sleep = max(0.0, self.frame_budget - (now - self.frame_start))
+            time.sleep(sleep)
+        total = time.perf_counter() - self.frame_start
+        idle = (self.waited + sleep) / total * 100 if total > 0 else 100.0
+        self.frame_time += (busy * 1000 - self.frame_time) * self.smoothing
+        self.idle_percent += (idle - self.idle_percent) * self.smoothing
 
 style_override = {
     "custom": {
@@ -312,12 +606,49 @@ style_override = {
     }
 }
 
+def _freeze(value):
+    # Deep read-only copy: dicts become mappingproxies and lists become tuples
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+def _thaw(value):
+    # Fresh mutable copy of a frozen value, handed to widget constructors
+    if isinstance(value, MappingProxyType):
+        return {k: _thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(v) for v in value]
+    return value
+
+
+class CompiledWidget(NamedTuple):
+    name: str
+    widget_type: str
+    args: MappingProxyType       # constructor arguments, without style
+    styles: dict[str, MappingProxyType]  # resolved style per state, "default" is the widget's initial state
+    signature: str               # canonical form, equal signatures build identical widgets
+
+
+class CompiledScene(NamedTuple):
+    name: str
+    widgets: tuple[CompiledWidget, ...]
+
+    def by_name(self) -> dict[str, CompiledWidget]:
+        return {w.name: w for w in self.widgets}
+
+
 class JSONUILoader:
     def __init__(self, scene_folder: pathlib.Path | str, style_file: str = "style.json"):
         if isinstance(scene_folder, str):
             scene_folder = pathlib.Path(scene_folder)
         self.scene_folder = scene_folder
+        self.style_file = style_file
         self.scenes = {}
+        self.compiled: dict[str, CompiledScene] = {}
+        self.file_stamps: dict[str, tuple[int, str]] = {}  # scene name -> (mtime_ns, sha1)
+        self.style_stamp = None
         self.widget_types = {
             "container": Container,
             "label": Label,
@@ -326,18 +657,56 @@ class JSONUILoader:
             "textbox": TextBox
         }
         self.style_mgr = StyleManager(style_file)
+        self.style_stamp = self._stamp(pathlib.Path(style_file))
+        self.reload_scenes()
 
-        for scene_file in scene_folder.iterdir():
-            with open(scene_file, "r") as f:
-                scene = json.load(f)
-                self.scenes[scene_file.stem] = scene
+    def _stamp(self, path: pathlib.Path) -> tuple[int, str]:
+        data = path.read_bytes()
+        return (path.stat().st_mtime_ns, hashlib.sha1(data).hexdigest())
 
-    def reload_scenes(self):
-        self.scenes = {}
+    def reload_scenes(self) -> set[str]:
+        """
+        Re-reads scene files whose modification time or content changed, and recompiles them.
+        A changed style file recompiles every scene.
+
+        :return: Names of the scenes whose compiled form changed.
+        """
+        changed = set()
+        style_path = pathlib.Path(self.style_file)
+        if style_path.stat().st_mtime_ns != self.style_stamp[0]:
+            stamp = self._stamp(style_path)
+            if stamp[1] != self.style_stamp[1]:
+                self.style_mgr = StyleManager(self.style_file)
+                changed.update(self.scenes)
+            self.style_stamp = stamp
+
+        seen = set()
         for scene_file in self.scene_folder.iterdir():
+            if scene_file.suffix != ".json":
+                continue
+            name = scene_file.stem
+            seen.add(name)
+            old = self.file_stamps.get(name)
+            if old is not None and scene_file.stat().st_mtime_ns == old[0]:
+                continue
+            stamp = self._stamp(scene_file)
+            if old is not None and stamp[1] == old[1]:
+                self.file_stamps[name] = stamp
+                continue
             with open(scene_file, "r") as f:
-                scene = json.load(f)
-                self.scenes[scene_file.stem] = scene
+                self.scenes[name] = json.load(f)
+            self.file_stamps[name] = stamp
+            changed.add(name)
+
+        for name in set(self.scenes) - seen:
+            del self.scenes[name]
+            self.compiled.pop(name, None)
+            self.file_stamps.pop(name, None)
+            changed.discard(name)
+
+        for name in changed:
+            self.compiled[name] = self._compile_scene(name, self.scenes[name])
+        return changed
 
     def register_widget_type(self, widget_type: str, widget_class: type[Widget]):
         """
@@ -352,49 +721,63 @@ class JSONUILoader:
         # Either makes a custom style or loads and modifies an existing style
         name = ""
         if "custom" in override_dict:
-            name = override_dict["custom"]["name"]
-            override_dict["custom"].pop("name")
-            self.style_mgr.add_style(override_dict["custom"], name)
+            custom = copy.deepcopy(override_dict["custom"])
+            name = custom.pop("name")
+            self.style_mgr.add_style(custom, name)
         elif "defined" in override_dict:
-            # First gets the original style, including all states
+            # First copies the original style, including all states
             name = override_dict["defined"]["name"]
-            original_style = self.style_mgr.styles.get(override_dict["defined"]["type"], {})
+            original_style = copy.deepcopy(self.style_mgr.styles.get(override_dict["defined"]["type"], {}))
 
             # Then applies the modifications
             for state, modifications in override_dict["defined"].get("states", {}).items():
-                original_style[state].update(modifications)
+                original_style.setdefault(state, {}).update(modifications)
 
-            self.style_mgr.add_style(original_style, override_dict["defined"]["name"])
+            self.style_mgr.add_style(original_style, name)
         
         return name
 
-    def _scene_to_ui(self, scene: dict):
+    def _compile_scene(self, scene_name: str, scene: dict) -> CompiledScene:
+        """
+        Turns a JSON scene definition into an immutable CompiledScene. The scene dict is not modified.
         """
-        Loads a UI from a JSON scene definition.
+        widgets = []
+        for key, widget in scene["widgets"].items():
+            args = {k: v for k, v in widget.items() if k not in ("type", "style_override")}
+            args["name"] = key
+            if "style_override" in widget:
+                style_name = self._handle_style_override(widget["style_override"])
+            else:
+                style_name = widget["type"]
+            styles = self.style_mgr.resolve_states(style_name, widget.get("state", "default"))
+            signature = json.dumps({"type": widget["type"], "args": args, "styles": {k: dict(v) for k, v in styles.items()}},
+                                   sort_keys=True, default=str)
+            widgets.append(CompiledWidget(key, widget["type"], _freeze(args), MappingProxyType(styles), signature))
+        return CompiledScene(scene_name, tuple(widgets))
+
+    def _build_widget(self, compiled: CompiledWidget) -> Widget:
+        widget_class = self.widget_types[compiled.widget_type]
+        args = _thaw(compiled.args)
+        args["style"] = compiled.styles["default"]
+        widget = widget_class(**args)
+        widget.set_styles(compiled.styles)
+        return widget
+
+    def _scene_to_ui(self, scene: CompiledScene):
+        """
+        Instantiates a UI from a compiled scene.
 
         Args:
-            scene (dict): JSON scene definition
+            scene (CompiledScene): Compiled scene definition
 
         Returns:
             UIManager: The loaded UI
         """
         ui = UIManager()
-        for key, widget in scene["widgets"].items():
-            widget_class = self.widget_types[widget["type"]]
-            args = widget
-            args["name"] = key
-
-            if "style_override" in widget:
-                name = self._handle_style_override(widget["style_override"])
-                args["style"] = self.style_mgr.get_style(name, widget.get("state", "default"))
-                args.pop("style_override")
-                args.pop("type")
-                ui.add(widget_class(**args))
-                continue
-
-            args["style"] = self.style_mgr.get_style(widget["type"], widget.get("state", "default"))
-            args.pop("type")
-            ui.add(widget_class(**args))
+        ui.scene_name = scene.name
+        for compiled in scene.widgets:
+            ui.add(self._build_widget(compiled))
+            ui.signatures[compiled.name] = compiled.signature
         return ui
 
     def load_scene(self, scene_name: str):
@@ -404,7 +787,38 @@ class JSONUILoader:
         :param scene_name: The name of the scene to load.
         :return: The UI representation of the scene.
         """
-        return self._scene_to_ui(self.scenes[scene_name])
+        return self._scene_to_ui(self.compiled[scene_name])
+
+    def reload_ui(self, ui: "UIManager"):
+        """
+        Brings a live UI up to date with its (possibly recompiled) scene. Widgets whose definition
+        did not change are kept as they are; changed widgets are rebuilt and take over the live
+        state named in their class' ``live_state`` (e.g. the playlist binding and scroll position).
+
+        :param ui: A UIManager returned by load_scene.
+        :return: Names of the widgets that were rebuilt.
+        """
+        scene = self.compiled[ui.scene_name]
+        old_widgets = dict(ui.named_widgets)
+        rebuilt = []
+        ui.widgets = []
+        ui.named_widgets = {}
+        for compiled in scene.widgets:
+            old = old_widgets.get(compiled.name)
+            if old is not None and ui.signatures.get(compiled.name) == compiled.signature:
+                widget = old
+            else:
+                widget = self._build_widget(compiled)
+                if old is not None:
+                    for attr in type(widget).live_state:
+                        if attr in old.__dict__:
+                            setattr(widget, attr, old.__dict__[attr])
+                    widget.set_styles(widget.styles)
+                rebuilt.append(compiled.name)
+            widget.mark_dirty()
+            ui.add(widget)
+        ui.signatures = {compiled.name: compiled.signature for compiled in scene.widgets}
+        return rebuilt
     
     def save_scene(self, scene_name: str, scene: dict):
         """
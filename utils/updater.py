@@ -1,66 +1,392 @@
 import os
 import sys
-import requests
+import json
+import shutil
+import hashlib
 import zipfile
 import tempfile
-import shutil
+import requests
+from typing import Optional
+from urllib.parse import urlparse
+from urllib.request import url2pathname
 
 # --- Config ---
-REPO = "reeet24/Python-Music-Player" 
+REPO = "reeet24/Python-Music-Player"
 BRANCH = "main"
 VERSION_FILE = "version.txt"
+# Optional list of shipped files and their hashes, written by `python -m utils.updater --build-manifest`.
+# Releases do not publish one at the moment, so the branch archive fallback is the path updates take.
+MANIFEST_FILE = "manifest.json"
+PENDING_FILE = "pending.json"  # under STATE_DIR: an update staged for the next start
+# Files are fetched as <SOURCE>/<path>; a file:// URL or a plain directory works too, e.g. for testing
+SOURCE = f"https://raw.githubusercontent.com/{REPO}/{BRANCH}"
+ARCHIVE_URL = f"https://github.com/{REPO}/archive/refs/heads/{BRANCH}.zip"
+STATE_DIR = ".update"  # staging, backups and the swap journal, inside the app folder so renames stay atomic
+# User files that updates merge into instead of replacing: new keys are added, existing values kept
+PRESERVED_FILES = {"config/settings.json"}
+# Never part of an update, even if a manifest or archive lists them
+SKIPPED_DIRS = {".git", "__pycache__", STATE_DIR, "music", "playlists"}
+CHUNK_SIZE = 64 * 1024
+
+# ---- Sources ----
+def _local_path(url: str) -> Optional[str]:
+    if url.startswith("file://"):
+        return url2pathname(urlparse(url).path)
+    if "://" not in url:
+        return url
+    return None
+
+def _join(source: str, rel_path: str) -> str:
+    return source.rstrip("/") + "/" + rel_path
+
+def _iter_chunks(url: str, timeout: float):
+    """
+    Yields the content at url in chunks. ``timeout`` applies to connecting and to each read.
+    """
+    path = _local_path(url)
+    if path is not None:
+        with open(path, "rb") as f:
+            while chunk := f.read(CHUNK_SIZE):
+                yield chunk
+        return
+    with requests.get(url, stream=True, timeout=timeout) as r:
+        r.raise_for_status()
+        yield from r.iter_content(CHUNK_SIZE)
+
+def _fetch(url: str, timeout: float) -> bytes:
+    return b"".join(_iter_chunks(url, timeout))
+
+def _download(url: str, dest: str, timeout: float) -> str:
+    """
+    Streams url to dest and returns the sha256 of what was written.
+    """
+    digest = hashlib.sha256()
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    with open(dest, "wb") as f:
+        for chunk in _iter_chunks(url, timeout):
+            digest.update(chunk)
+            f.write(chunk)
+    return digest.hexdigest()
+
+def _file_sha256(path: str) -> Optional[str]:
+    if not os.path.isfile(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _skipped(rel_path: str) -> bool:
+    parts = rel_path.split("/")
+    # Paths that would land outside the app folder are never written
+    if rel_path.startswith("/") or ".." in parts or ":" in parts[0]:
+        return True
+    return parts[0] in SKIPPED_DIRS or "__pycache__" in parts
 
-def get_local_version() -> str:
-    if os.path.exists(VERSION_FILE):
-        with open(VERSION_FILE, "r", encoding="utf-8") as f:
+# ---- Versions and manifests ----
+def get_local_version(root: Optional[str] = None) -> str:
+    path = os.path.join(root or os.getcwd(), VERSION_FILE)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
             return f.read().strip()
     return "0.0.0"
 
-def get_remote_version() -> str:
-    url = f"https://raw.githubusercontent.com/{REPO}/{BRANCH}/{VERSION_FILE}"
-    r = requests.get(url)
-    if r.status_code == 200:
-        return r.text.strip()
-    raise RuntimeError(f"Failed to fetch remote version: {r.status_code}")
+def get_remote_version(timeout: float = 10, source: str = SOURCE) -> str:
+    try:
+        return _fetch(_join(source, VERSION_FILE), timeout).decode("utf-8").strip()
+    except (requests.RequestException, OSError) as e:
+        raise RuntimeError(f"Failed to fetch remote version: {e}")
 
-def download_and_extract():
-    url = f"https://github.com/{REPO}/archive/refs/heads/{BRANCH}.zip"
-    print(f"Downloading {url}...")
-    r = requests.get(url, stream=True)
-    r.raise_for_status()
+def build_manifest(root: str) -> dict:
+    """
+    Hashes every file under root that an update may ship.
 
-    temp_dir = tempfile.mkdtemp()
-    zip_path = os.path.join(temp_dir, "repo.zip")
+    :return: {"version", "files": {relative path: {"sha256", "size"}}}
+    """
+    files = {}
+    for directory, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith(".") and d not in SKIPPED_DIRS)
+        for filename in sorted(filenames):
+            path = os.path.join(directory, filename)
+            rel_path = os.path.relpath(path, root).replace(os.sep, "/")
+            if rel_path == MANIFEST_FILE or _skipped(rel_path):
+                continue
+            files[rel_path] = {"sha256": _file_sha256(path), "size": os.path.getsize(path)}
+    return {"version": get_local_version(root), "files": files}
 
-    with open(zip_path, "wb") as f:
-        for chunk in r.iter_content(8192):
-            f.write(chunk)
+def _load_state_manifest(root: str) -> dict:
+    # Manifest of the last applied update, used to tell shipped files that were removed from user files
+    try:
+        with open(os.path.join(root, STATE_DIR, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"files": {}}
+
+# ---- Staging ----
+def _merge_preserved(rel_path: str, staged: str, root: str):
+    """
+    Keeps the user's values in a preserved JSON file, taking only keys the user does not have yet.
+    """
+    local = os.path.join(root, rel_path)
+    if not os.path.exists(local):
+        return
+    try:
+        with open(local, "r", encoding="utf-8") as f:
+            user = json.load(f)
+        with open(staged, "r", encoding="utf-8") as f:
+            shipped = json.load(f)
+    except (OSError, ValueError):
+        # Not mergeable; leave the user's file alone
+        os.remove(staged)
+        return
+    merged = {**shipped, **user}
+    if merged == user:
+        os.remove(staged)
+        return
+    with open(staged, "w", encoding="utf-8") as f:
+        json.dump(merged, f, indent=4)
+
+def stage_from_manifest(manifest: dict, source: str, root: str, staging: str, timeout: float) -> dict[str, str]:
+    """
+    Downloads only the files whose hash differs from the local copy and verifies each one.
+
+    :return: {relative path: staged file}
+    """
+    staged = {}
+    for rel_path, entry in manifest["files"].items():
+        if _skipped(rel_path) or _file_sha256(os.path.join(root, rel_path)) == entry["sha256"]:
+            continue
+        dest = os.path.join(staging, rel_path)
+        digest = _download(_join(source, rel_path), dest, timeout)
+        if digest != entry["sha256"]:
+            raise RuntimeError(f"Checksum mismatch for {rel_path}")
+        staged[rel_path] = dest
+    return staged
+
+def stage_from_archive(archive_url: str, root: str, staging: str, timeout: float) -> tuple[dict[str, str], dict]:
+    """
+    Fallback when the source has no manifest: downloads the branch archive and extracts only the
+    members that differ from the local copy. A member the same size as its local file is hashed
+    from the archive first and only written out if the hash differs.
+
+    :return: ({relative path: staged file}, manifest built from the archive)
+    """
+    archive_path = os.path.join(staging, "archive.zip")
+    _download(archive_url, archive_path, timeout)
+    staged = {}
+    files = {}
+    with zipfile.ZipFile(archive_path, "r") as archive:
+        members = [info for info in archive.infolist() if not info.is_dir()]
+        # GitHub archives put everything under "<repo>-<branch>/"
+        prefixes = {info.filename.split("/", 1)[0] for info in members}
+        strip = len(prefixes.pop()) + 1 if len(prefixes) == 1 and all("/" in info.filename for info in members) else 0
+        for info in members:
+            rel_path = info.filename[strip:]
+            if not rel_path or _skipped(rel_path):
+                continue
+            local = os.path.join(root, rel_path)
+            if os.path.isfile(local) and os.path.getsize(local) == info.file_size:
+                digest = hashlib.sha256()
+                with archive.open(info) as src:
+                    while chunk := src.read(CHUNK_SIZE):
+                        digest.update(chunk)
+                files[rel_path] = {"sha256": digest.hexdigest(), "size": info.file_size}
+                if _file_sha256(local) == files[rel_path]["sha256"]:
+                    continue
+            # New, resized or changed: extract, hashing on the way when not done above
+            dest = os.path.join(staging, "files", rel_path)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            digest = hashlib.sha256()
+            with archive.open(info) as src, open(dest, "wb") as f:
+                while chunk := src.read(CHUNK_SIZE):
+                    digest.update(chunk)
+                    f.write(chunk)
+            files[rel_path] = {"sha256": digest.hexdigest(), "size": info.file_size}
+            staged[rel_path] = dest
+    os.remove(archive_path)
+    return staged, {"files": files}
+
+# ---- Swap ----
+def _journal_path(root: str) -> str:
+    return os.path.join(root, STATE_DIR, "journal.json")
+
+def _write_journal(root: str, journal: list):
+    path = _journal_path(root)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(journal, f)
+    os.replace(path + ".tmp", path)
+
+def _rollback(root: str, journal: list):
+    backup_dir = os.path.join(root, STATE_DIR, "backup")
+    for rel_path, existed in reversed(journal):
+        dst = os.path.join(root, rel_path)
+        backup = os.path.join(backup_dir, rel_path)
+        if existed:
+            # No backup means the failure came before the original was moved; it is still in place
+            if os.path.exists(backup):
+                os.replace(backup, dst)
+        elif os.path.exists(dst):
+            os.remove(dst)
 
-    with zipfile.ZipFile(zip_path, "r") as zip_ref:
-        zip_ref.extractall(temp_dir)
-
-    extracted_dir = next(
-        os.path.join(temp_dir, d)
-        for d in os.listdir(temp_dir)
-        if os.path.isdir(os.path.join(temp_dir, d))
-    )
-    return extracted_dir, temp_dir
-
-def update_files(new_dir: str):
-    for item in os.listdir(new_dir):
-        src = os.path.join(new_dir, item)
-        dst = os.path.join(os.getcwd(), item)
-
-        if os.path.isdir(src):
-            if os.path.exists(dst):
-                shutil.rmtree(dst)
-            shutil.copytree(src, dst)
-        else:
-            shutil.copy2(src, dst)
-
-def Update():
-    local = get_local_version()
-    remote = get_remote_version()
+def recover(root: Optional[str] = None) -> bool:
+    """
+    Rolls back a swap that was interrupted (crash or power loss) before it finished.
+
+    :return: True if something was rolled back.
+    """
+    root = root or os.getcwd()
+    try:
+        with open(_journal_path(root), "r", encoding="utf-8") as f:
+            journal = json.load(f)
+    except (OSError, ValueError):
+        return False
+    print("Rolling back an interrupted update...")
+    _rollback(root, journal)
+    os.remove(_journal_path(root))
+    return True
+
+def swap(root: str, staged: dict[str, str], removed: list[str]):
+    """
+    Moves staged files into place and removed files out of the way, one rename each. Every step
+    is journaled first, so any failure (or a crash, through recover()) restores the old files.
+    """
+    backup_dir = os.path.join(root, STATE_DIR, "backup")
+    shutil.rmtree(backup_dir, ignore_errors=True)
+    journal = []
+    # version.txt goes last, so a partial swap never reports the new version
+    order = sorted(staged, key=lambda rel_path: rel_path == VERSION_FILE)
+    try:
+        for rel_path in order + removed:
+            dst = os.path.join(root, rel_path)
+            existed = os.path.exists(dst)
+            journal.append((rel_path, existed))
+            _write_journal(root, journal)
+            if existed:
+                backup = os.path.join(backup_dir, rel_path)
+                os.makedirs(os.path.dirname(backup), exist_ok=True)
+                os.replace(dst, backup)
+            if rel_path in staged:
+                os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+                os.replace(staged[rel_path], dst)
+    except Exception:
+        _rollback(root, journal)
+        os.remove(_journal_path(root))
+        raise
+    os.remove(_journal_path(root))
+    shutil.rmtree(backup_dir, ignore_errors=True)
+
+# ---- Update ----
+def _pending_path(root: str) -> str:
+    return os.path.join(root, STATE_DIR, PENDING_FILE)
+
+def _load_pending(root: str) -> Optional[dict]:
+    try:
+        with open(_pending_path(root), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def discard_pending(root: Optional[str] = None):
+    root = root or os.getcwd()
+    pending = _load_pending(root)
+    if os.path.exists(_pending_path(root)):
+        os.remove(_pending_path(root))
+    if pending and pending.get("staging"):
+        shutil.rmtree(os.path.join(root, STATE_DIR, pending["staging"]), ignore_errors=True)
+
+def pending_version(root: Optional[str] = None) -> Optional[str]:
+    # Version of the update waiting for the next start, if any
+    pending = _load_pending(root or os.getcwd())
+    return pending.get("version") if pending else None
+
+def stage_update(source: str = SOURCE, archive_url: str = ARCHIVE_URL, root: Optional[str] = None, timeout: float = 10) -> int:
+    """
+    Downloads the changed files into .update without touching the installed ones, so a running
+    player never loads half of an update. apply_pending() installs them on the next start.
+
+    :return: Number of files staged.
+    """
+    root = root or os.getcwd()
+    os.makedirs(os.path.join(root, STATE_DIR), exist_ok=True)
+    recover(root)
+    discard_pending(root)
+    staging = tempfile.mkdtemp(prefix="staging-", dir=os.path.join(root, STATE_DIR))
+    try:
+        try:
+            manifest = json.loads(_fetch(_join(source, MANIFEST_FILE), timeout))
+            staged = stage_from_manifest(manifest, source, root, staging, timeout)
+        except (requests.RequestException, OSError, ValueError) as e:
+            print(f"No usable manifest ({e}), falling back to the archive")
+            staged, manifest = stage_from_archive(archive_url, root, staging, max(timeout, 30))
+        pending = {
+            "version": manifest.get("version") or get_remote_version(timeout, source),
+            "base": get_local_version(root),  # staged against these files; stale once they change
+            "staging": os.path.basename(staging),
+            "staged": {rel_path: os.path.relpath(path, staging) for rel_path, path in staged.items()},
+            "files": manifest["files"]
+        }
+        with open(_pending_path(root) + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(pending, f)
+        os.replace(_pending_path(root) + ".tmp", _pending_path(root))
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return len(staged)
+
+def apply_pending(root: Optional[str] = None) -> int:
+    """
+    Installs a staged update. Call before the app imports anything else it ships.
+
+    :return: Number of files replaced, added or removed; 0 if nothing was pending.
+    """
+    root = root or os.getcwd()
+    recover(root)
+    pending = _load_pending(root)
+    if pending is None:
+        return 0
+    try:
+        if get_local_version(root) != pending["base"]:
+            print("Discarding a staged update made for another version")
+            return 0
+        staging = os.path.join(root, STATE_DIR, pending["staging"])
+        staged = {rel_path: os.path.join(staging, path) for rel_path, path in pending["staged"].items()}
+        if not all(os.path.exists(path) for path in staged.values()):
+            print("Discarding an incomplete staged update")
+            return 0
+
+        # Merged now rather than when staging, so settings changed since then are kept
+        for rel_path in PRESERVED_FILES & set(staged):
+            _merge_preserved(rel_path, staged[rel_path], root)
+            if not os.path.exists(staged[rel_path]):
+                del staged[rel_path]
+
+        # Only files a previous update shipped are removed; anything else in the folder is the user's
+        previous = _load_state_manifest(root)["files"]
+        removed = [rel_path for rel_path in previous
+                   if rel_path not in pending["files"] and rel_path not in PRESERVED_FILES
+                   and os.path.exists(os.path.join(root, rel_path))]
+
+        swap(root, staged, removed)
+        with open(os.path.join(root, STATE_DIR, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump({"files": pending["files"]}, f)
+        return len(staged) + len(removed)
+    finally:
+        discard_pending(root)
+
+def apply_update(source: str = SOURCE, archive_url: str = ARCHIVE_URL, root: Optional[str] = None, timeout: float = 10) -> int:
+    """
+    Brings root in line with source right away, downloading only changed files. Only safe while
+    the app is not running, e.g. from the command line.
+
+    :return: Number of files replaced, added or removed.
+    """
+    stage_update(source, archive_url, root, timeout)
+    return apply_pending(root)
+
+def Update(exit_after: bool = True, timeout: float = 10, source: str = SOURCE, archive_url: str = ARCHIVE_URL, root: Optional[str] = None):
+    local = get_local_version(root)
+    remote = get_remote_version(timeout, source)
     print(f"Local version: {local}")
     print(f"Remote version: {remote}")
 
@@ -69,14 +395,18 @@ def Update():
         return True
 
     print("Updating...")
-    new_dir, temp_dir = download_and_extract()
-    try:
-        update_files(new_dir)
-    finally:
-        shutil.rmtree(temp_dir)
+    changed = apply_update(source, archive_url, root, timeout)
 
-    print("Update complete! Please restart the program.")
-    sys.exit(0)
+    print(f"Update complete ({changed} files changed)! Please restart the program.")
+    if exit_after:
+        sys.exit(0)
+    return True
 
 if __name__ == "__main__":
-    Update()
+    if "--build-manifest" in sys.argv:
+        # Run from the repository root before a release
+        with open(MANIFEST_FILE, "w", encoding="utf-8") as f:
+            json.dump(build_manifest(os.getcwd()), f, indent=2)
+        print(f"Wrote {MANIFEST_FILE}")
+    else:
+        Update()
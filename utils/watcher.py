@@ -0,0 +1,196 @@
+# watcher.py
+import os
+import time
+import threading
+from typing import Callable
+
+try:
+    # watchdog uses inotify on Linux (FSEvents/ReadDirectoryChangesW elsewhere); polling is the fallback
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+class _EventForwarder(FileSystemEventHandler): # type: ignore
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.watcher._record_created(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.watcher._record_created(event.src_path, touch_only=True)
+
+    def on_deleted(self, event):
+        if not event.is_directory:
+            self.watcher._record_deleted(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.watcher._record_moved(event.src_path, event.dest_path)
+
+
+class LibraryWatcher:
+    """
+    Watches a music folder and reports created, deleted and renamed files.
+
+    Events are debounced: a path is only reported once it has been quiet for ``debounce``
+    seconds and its size stopped changing, so a file still being written by the ffmpeg
+    postprocessor is reported once, when it is complete.
+
+    :param on_changes: Called with (created, deleted, moved) lists; moved holds (src, dest) pairs.
+    """
+    def __init__(self, directory: str, on_changes: Callable[[list[str], list[str], list[tuple[str, str]]], None],
+                 extensions: tuple[str, ...] = (".mp3",), debounce: float = 1.0, poll_interval: float = 2.0,
+                 use_polling: bool = False):
+        self.directory = directory
+        self.on_changes = on_changes
+        self.extensions = extensions
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.use_polling = use_polling or Observer is None
+        self.lock = threading.Lock()
+        self.created: dict[str, tuple[float, int]] = {}   # path -> (last event time, last seen size)
+        self.deleted: dict[str, float] = {}
+        self.moved: dict[str, tuple[str, float]] = {}     # dest -> (src, time)
+        self.running = False
+        self.observer = None
+
+    def _wanted(self, path: str) -> bool:
+        return path.lower().endswith(self.extensions) and os.path.dirname(os.path.abspath(path)) == os.path.abspath(self.directory)
+
+    def _normalize(self, path: str) -> str:
+        return os.path.join(self.directory, os.path.basename(path))
+
+    def _size(self, path: str) -> int:
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return -1
+
+    def _record_created(self, path: str, touch_only: bool = False):
+        if not self._wanted(path):
+            return
+        path = self._normalize(path)
+        with self.lock:
+            if path in self.moved:
+                src, _ = self.moved[path]
+                self.moved[path] = (src, time.monotonic())
+            elif path in self.created or not touch_only:
+                self.created[path] = (time.monotonic(), self._size(path))
+                self.deleted.pop(path, None)
+
+    def _record_deleted(self, path: str):
+        if not self._wanted(path):
+            return
+        path = self._normalize(path)
+        with self.lock:
+            if self.created.pop(path, None) is None:
+                self.deleted[path] = time.monotonic()
+
+    def _record_moved(self, src: str, dest: str):
+        src_wanted, dest_wanted = self._wanted(src), self._wanted(dest)
+        if src_wanted and dest_wanted:
+            src, dest = self._normalize(src), self._normalize(dest)
+            with self.lock:
+                if self.created.pop(src, None) is not None:
+                    # Renamed before it was ever reported, so it is just a new file
+                    self.created[dest] = (time.monotonic(), self._size(dest))
+                else:
+                    self.moved[dest] = (src, time.monotonic())
+        elif src_wanted:
+            self._record_deleted(src)
+        elif dest_wanted:
+            # e.g. a ".part" or ".temp.mp3" renamed into place
+            self._record_created(dest)
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        if self.use_polling:
+            threading.Thread(target=self._poll_loop, daemon=True).start()
+        else:
+            self.observer = Observer()
+            self.observer.schedule(_EventForwarder(self), self.directory, recursive=False)
+            self.observer.daemon = True
+            self.observer.start()
+        threading.Thread(target=self._flush_loop, daemon=True).start()
+
+    def stop(self):
+        self.running = False
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer = None
+
+    def _snapshot(self) -> dict[str, tuple[float, int]]:
+        snapshot = {}
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.is_file() and entry.name.lower().endswith(self.extensions):
+                        stat = entry.stat()
+                        snapshot[os.path.join(self.directory, entry.name)] = (stat.st_mtime, stat.st_size)
+        except OSError:
+            pass
+        return snapshot
+
+    def _poll_loop(self):
+        previous = self._snapshot()
+        while self.running:
+            time.sleep(self.poll_interval)
+            current = self._snapshot()
+            appeared = current.keys() - previous.keys()
+            vanished = previous.keys() - current.keys()
+
+            # A file that vanished and one that appeared with the same mtime and size is a rename
+            vanished_by_stat = {previous[path]: path for path in vanished}
+            for path in appeared:
+                src = vanished_by_stat.pop(current[path], None)
+                if src is not None:
+                    self._record_moved(src, path)
+                else:
+                    self._record_created(path)
+            for path in vanished_by_stat.values():
+                self._record_deleted(path)
+            for path in current.keys() & previous.keys():
+                if current[path] != previous[path]:
+                    self._record_created(path, touch_only=True)
+            previous = current
+
+    def _flush_loop(self):
+        while self.running:
+            time.sleep(min(0.25, self.debounce))
+            self.flush()
+
+    def flush(self, force: bool = False):
+        """
+        Reports every pending change that has settled. force reports everything pending.
+        """
+        now = time.monotonic()
+        created, deleted, moved = [], [], []
+        with self.lock:
+            for path, (stamp, size) in list(self.created.items()):
+                if force or now - stamp >= self.debounce:
+                    current_size = self._size(path)
+                    if current_size < 0:
+                        del self.created[path]
+                    elif current_size == size or force:
+                        del self.created[path]
+                        created.append(path)
+                    else:
+                        # Still growing, wait another debounce period
+                        self.created[path] = (now, current_size)
+            for path, stamp in list(self.deleted.items()):
+                if force or now - stamp >= self.debounce:
+                    del self.deleted[path]
+                    deleted.append(path)
+            for dest, (src, stamp) in list(self.moved.items()):
+                if force or now - stamp >= self.debounce:
+                    del self.moved[dest]
+                    moved.append((src, dest))
+        if created or deleted or moved:
+            self.on_changes(created, deleted, moved)
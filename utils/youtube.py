@@ -0,0 +1,98 @@
+# youtube.py
+import re
+import queue
+import threading
+from typing import Callable, Optional
+import requests
+
+# Matches the "%(title)s-%(id)s.%(ext)s" outtmpl used for downloads. YouTube ids are 11
+# characters of [A-Za-z0-9_-] and the last one only carries 4 bits, hence the narrower class.
+FILENAME_ID_PATTERN = re.compile(r"^(?P<title>.*)-(?P<id>[A-Za-z0-9_-]{10}[AEIMQUYcgkosw048])\.(?P<ext>[A-Za-z0-9]+)$")
+
+def parse_filename(filename: str) -> tuple[str, Optional[str]]:
+    """
+    Splits a downloaded file name into its title and YouTube id without touching the network.
+
+    :param filename: Base name of the file, including the extension.
+    :return: (title, youtube_id). youtube_id is None if the name does not follow the outtmpl.
+    """
+    match = FILENAME_ID_PATTERN.match(filename)
+    if match:
+        return match.group("title"), match.group("id")
+    return filename.rsplit(".", 1)[0], None
+
+
+class YouTubeIdValidator:
+    """
+    Optional background check that extracted ids point at real videos.
+
+    Ids are queued, checked in batches over a single HTTP session with a short timeout and the
+    results are handed to on_results so they can be cached alongside the song metadata.
+    Nothing here blocks the caller.
+
+    :param stored_result: Returns the cached result for an id, or None if it was never checked,
+        so ids validated in an earlier session are not sent again.
+    """
+    OEMBED_URL = "https://www.youtube.com/oembed?format=json&url=https://www.youtube.com/watch?v={id}"
+
+    def __init__(self, on_results: Callable[[dict[str, bool]], None], batch_size: int = 25, timeout: float = 3,
+                 stored_result: Optional[Callable[[str], Optional[bool]]] = None):
+        self.on_results = on_results
+        self.stored_result = stored_result
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.pending = queue.Queue()
+        self.checked: dict[str, bool] = {}
+        self.running = False
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        threading.Thread(target=self._worker, daemon=True).start()
+
+    def stop(self):
+        self.running = False
+        self.pending.put(None)
+
+    def submit(self, youtube_id: str):
+        if not youtube_id or youtube_id in self.checked:
+            return
+        if self.stored_result is not None:
+            stored = self.stored_result(youtube_id)
+            if stored is not None:
+                self.checked[youtube_id] = stored
+                return
+        self.pending.put(youtube_id)
+
+    def _next_batch(self) -> list[str]:
+        batch = []
+        item = self.pending.get()
+        while item is not None:
+            if item not in self.checked and item not in batch:
+                batch.append(item)
+            if len(batch) >= self.batch_size:
+                break
+            try:
+                item = self.pending.get(timeout=0.5)
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        session = requests.Session()
+        while self.running:
+            batch = self._next_batch()
+            if not batch:
+                continue
+            results = {}
+            for youtube_id in batch:
+                try:
+                    r = session.get(self.OEMBED_URL.format(id=youtube_id), timeout=self.timeout)
+                except Exception:
+                    # Offline or flaky: leave unchecked so a later run can retry
+                    continue
+                results[youtube_id] = r.status_code == 200
+            self.checked.update(results)
+            if results:
+                self.on_results(results)